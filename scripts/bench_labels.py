@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Compare the label modes of the map builder.
+
+For every ``LABEL_MODE`` (and both ``MARKER_MODE`` values) the map is built and
+rendered a few times without saving; the best build time and the page size
+are printed.
+
+In ``"folium"`` ``MARKER_MODE`` the Leaflet layers the page creates for its
+peaks are counted from the map: markers (pins and DivIcon labels) and the
+tooltips bound to them, each drawn as its own DOM node. ``"data"`` mode builds
+the same layers in the browser once a layer is shown, so nothing is counted
+for it.
+
+Usage: python scripts/bench_labels.py [repeats]
+"""
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import folium  # noqa: E402
+
+import build_map  # noqa: E402
+from bundle import walk  # noqa: E402
+
+
+def count_layers(m: folium.Map) -> str:
+    """Markers and tooltips created for the peaks of ``m``, in total and per pin (a peak in a layer)."""
+    elements = list(walk(m))
+    peaks = sum(isinstance(e, folium.Popup) for e in elements)
+    markers = sum(isinstance(e, folium.Marker) for e in elements)
+    tooltips = sum(isinstance(e, folium.Tooltip) for e in elements)
+    return f"{markers:4} markers  {tooltips:4} tooltips  {(markers + tooltips) / peaks:4.1f} per pin"
+
+
+def bench(marker_mode: str, label_mode: str, repeats: int) -> None:
+    build_map.MARKER_MODE = marker_mode
+    build_map.LABEL_MODE = label_mode
+    best = float("inf")
+    for _ in range(repeats):
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            m = build_map.build_map()
+            page = m.get_root().render()
+        best = min(best, time.perf_counter() - t)
+    layers = count_layers(m) if marker_mode == "folium" else "built in the browser"
+    print(f"{marker_mode:>6} / {label_mode:<7}  {best * 1000:7.1f} ms  {len(page.encode()) / 1024:7.1f} KB  {layers}")
+
+
+def main() -> None:
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for marker_mode in ("folium", "data"):
+        for label_mode in ("marker", "tooltip"):
+            bench(marker_mode, label_mode, repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Download the CDN assets of the map page for offline bundles.
+
+Every script and stylesheet that folium (and the Leaflet.markercluster plugin)
+can link into the page is saved under ``vendor/<host>/<path>``, together with
+the images and fonts its stylesheets reference. Run it once with network
+access, and again after upgrading folium, then build with ``ASSET_BUNDLE``
+set.
+
+Usage: python scripts/vendor_assets.py [vendor_dir]
+"""
+import sys
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import folium  # noqa: E402
+from folium.plugins import MarkerCluster  # noqa: E402
+
+from build_map import VENDOR_DIR  # noqa: E402
+from bundle import css_urls, vendor_path  # noqa: E402
+
+
+def fetch(url: str, vendor_dir: Path) -> bytes:
+    with urllib.request.urlopen(url, timeout=30) as response:
+        data = response.read()
+    path = vendor_path(url, vendor_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    print(f"{len(data) / 1024:7.1f} KB  {url}")
+    return data
+
+
+def main() -> None:
+    vendor_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else VENDOR_DIR
+    for cls in (folium.Map, MarkerCluster):
+        for _, url in cls.default_js:
+            fetch(url, vendor_dir)
+        for _, url in cls.default_css:
+            css = fetch(url, vendor_dir).decode("utf-8")
+            for resource in dict.fromkeys(css_urls(css, url)):
+                fetch(resource, vendor_dir)
+
+
+if __name__ == "__main__":
+    main()
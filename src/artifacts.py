@@ -0,0 +1,288 @@
+"""
+Output stage of the build: streaming page writer, minification and
+precompression.
+
+Saving a folium map renders every element's script into one page string (and
+keeps each rendered script as a template on the way). :func:`write_page`
+instead writes each element's script to a spool file as soon as it is
+rendered, then streams the page out through a buffered file handle, so the
+rendered scripts never sit in memory together.
+
+Folium renders readable pages: indented markup, scripts and pretty-printed
+JSON options. :func:`minify_html` strips the whitespace and comments of the
+markup and of the inline scripts (:func:`minify_js`) and stylesheets
+(:func:`minify_css`). The minifiers are conservative: they tokenize strings,
+template literals, regular expressions and comments, and keep a line break
+wherever removing it could change how a statement ends.
+
+:func:`precompress` writes ``.gz`` and ``.br`` siblings at maximum
+compression, for servers that send precompressed files as they are (e.g.
+nginx ``gzip_static``). It needs the ``brotli`` package; the rest of the
+module does not.
+"""
+from __future__ import annotations
+
+import gzip
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from branca.element import Element
+
+try:
+    import brotli
+except ImportError:  # only needed by precompress()
+    brotli = None
+
+# Suffixes of the compressed siblings written by precompress().
+SUFFIXES = (".gz", ".br")
+
+# Words after which a ``/`` starts a regular expression, not a division.
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void", "delete", "throw", "new"}
+# Statements whose parenthesized head can be followed by a regular expression,
+# as in ``if (x) /re/.test(y)``.
+_HEAD_KEYWORDS = {"if", "while", "for", "with"}
+# Characters after which a line break can go (no statement ends there).
+_JOIN_AFTER = set("{([,;:=&|?")
+# Characters before which a line break can go (no statement starts there).
+_JOIN_BEFORE = set("})].,;:?")
+# Inline blocks minified on their own; the rest of the markup is collapsed.
+_BLOCK = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c in "_$\\" or ord(c) > 127
+
+
+def minify_js(code: str) -> str:
+    """Strip the comments and redundant whitespace of a script.
+
+    ``/*! ... */`` comments and those with ``@license`` or ``@preserve`` are
+    kept.
+    """
+    out: List[str] = []
+    tail = ""  # last character written
+    word = ""  # last token, if an identifier or keyword
+    gap = ""  # whitespace skipped since then: "", " " or "\n"
+    heads: List[bool] = []  # per open "(": whether it starts a statement head
+    head = False  # whether the last token closed a statement head
+    i, n = 0, len(code)
+
+    def emit(text: str) -> None:
+        nonlocal tail, word, gap, head
+        c = text[0]
+        if gap and tail:
+            if _is_word(tail) and _is_word(c) or tail == c and c in "+-" or tail == "/" and c in "/*":
+                out.append(gap)
+            elif gap == "\n" and tail not in _JOIN_AFTER and c not in _JOIN_BEFORE:
+                out.append(gap)
+        out.append(text)
+        if text == "(":
+            heads.append(word in _HEAD_KEYWORDS)
+        head = text == ")" and bool(heads) and heads.pop()
+        word = text if _is_word(c) else ""
+        tail, gap = text[-1], ""
+
+    while i < n:
+        c = code[i]
+        if c in " \t\r\n\f\v\u00a0\ufeff":
+            j = i
+            while j < n and code[j] in " \t\r\n\f\v\u00a0\ufeff":
+                j += 1
+            gap = "\n" if "\n" in code[i:j] or gap == "\n" else " "
+            i = j
+        elif code.startswith("//", i):
+            j = code.find("\n", i)
+            i = n if j < 0 else j
+        elif code.startswith("/*", i):
+            j = code.find("*/", i + 2)
+            j = n if j < 0 else j + 2
+            comment = code[i:j]
+            if comment.startswith("/*!") or "@license" in comment or "@preserve" in comment:
+                emit(comment)
+                gap = "\n"
+            else:
+                gap = "\n" if "\n" in comment or gap == "\n" else gap or " "
+            i = j
+        elif c in "'\"`" or c == "/" and (
+            not tail or tail in "(,=:[!&|?{};+-*%<>~^" or word in _REGEX_KEYWORDS or head
+        ):
+            # String, template literal or regular expression: copied as is.
+            j, in_class = i + 1, False
+            while j < n:
+                d = code[j]
+                if d == "\\":
+                    j += 2
+                    continue
+                if c == "/" and d == "[":
+                    in_class = True
+                elif c == "/" and d == "]":
+                    in_class = False
+                elif d == c and not in_class:
+                    break
+                elif d == "\n" and c in "'\"/":
+                    break
+                j += 1
+            emit(code[i : j + 1])
+            i = j + 1
+        elif _is_word(c):
+            j = i
+            while j < n and _is_word(code[j]):
+                j += 1
+            emit(code[i:j])
+            i = j
+        else:
+            emit(c)
+            i += 1
+    return "".join(out)
+
+
+def minify_css(css: str) -> str:
+    """Strip the comments and redundant whitespace of a stylesheet."""
+    parts = re.split(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""", re.sub(r"/\*.*?\*/", "", css, flags=re.S))
+    for k in range(0, len(parts), 2):
+        text = re.sub(r"\s+", " ", parts[k])
+        # Not around ":", whose leading space is a descendant selector.
+        text = re.sub(r" ?([{};,>]) ?", r"\1", text).replace(": ", ":")
+        parts[k] = text.replace(";}", "}")
+    return "".join(parts).strip()
+
+
+def minify_html(page: str) -> str:
+    """Minify a page: its markup, inline scripts and stylesheets.
+
+    Indentation and comments are removed from the markup; line breaks between
+    tags are kept (one rendered space at most). ``<pre>`` and ``<textarea>``
+    blocks and scripts of other types (e.g. JSON data) are left untouched.
+    """
+
+    def markup(text: str) -> str:
+        text = re.sub(r"<!--(?!\[if).*?-->", "", text, flags=re.S)
+        return re.sub(r"[ \t]*\n\s*", "\n", text)
+
+    out, pos = [], 0
+    for match in _BLOCK.finditer(page):
+        out.append(markup(page[pos : match.start()]))
+        start, tag, body, end = match.groups()
+        tag = tag.lower()
+        if tag == "style":
+            body = minify_css(body)
+        elif tag == "script" and not re.search(r"\btype\s*=\s*[\"']?(?!text/javascript|module)", start, re.I):
+            body = minify_js(body).strip()
+        out.append(start + body + end)
+        pos = match.end()
+    out.append(markup(page[pos:]))
+    return "".join(out).strip() + "\n"
+
+
+class _ScriptSpool(Element):
+    """Stand-in for a figure's ``script`` section that writes each script added
+    to it to a temporary file, instead of keeping it as a child element.
+
+    Renders as :attr:`MARKER`, where :func:`write_page` splices the file in.
+    """
+
+    MARKER = "\x00script\x00"
+
+    def __init__(self, minify: bool) -> None:
+        super().__init__()
+        self.minify = minify
+        self.file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.names: set = set()
+        self.rendered = self.written = 0
+
+    def add_child(self, child: Element, name: str | None = None, index: int | None = None) -> Element:
+        name = child.get_name() if name is None else name
+        # A name seen before is a class include, rendered once (see folium.map).
+        if name not in self.names:
+            self.names.add(name)
+            text = child.render()
+            self.rendered += len(text.encode("utf-8"))
+            if self.minify:
+                text = minify_js(text).strip() + "\n"
+            self.written += len(text.encode("utf-8"))
+            self.file.write(text)
+        return self
+
+    def render(self, **kwargs: Any) -> str:
+        return self.MARKER
+
+
+def write_page(m: Any, path: Path, minify: bool = False, buffer_size: int = 1 << 16) -> Tuple[int, int]:
+    """Render the page of ``m`` into ``path``, one element script at a time.
+
+    The head and body sections are small and rendered as usual; the script
+    section is spooled to a temporary file while the elements render, and
+    copied into the page in ``buffer_size`` chunks.
+
+    Args:
+        m: Map (or any element of the figure) to save.
+        path: Output file.
+        minify: Minify each script (:func:`minify_js`) and the markup
+            (:func:`minify_html`) on the way.
+        buffer_size: Size of the write buffer and of the copied chunks.
+
+    Returns:
+        ``(rendered, written)`` sizes of the page in bytes, before and after
+        minification.
+    """
+    figure = m.get_root()
+    section, spool = figure.script, _ScriptSpool(minify)
+    spool._parent = figure
+    figure.script = spool
+    try:
+        head, tail = figure.render().split(_ScriptSpool.MARKER)
+        rendered = len(head.encode("utf-8")) + spool.rendered + len(tail.encode("utf-8"))
+        if minify:
+            head, tail = minify_html(head), minify_html(tail)
+        with open(path, "w", encoding="utf-8", buffering=buffer_size) as out:
+            out.write(head)
+            spool.file.seek(0)
+            shutil.copyfileobj(spool.file, out, buffer_size)
+            out.write(tail)
+        return rendered, len(head.encode("utf-8")) + spool.written + len(tail.encode("utf-8"))
+    finally:
+        figure.script = section
+        spool.file.close()
+
+
+def _compress(path: Path, suffix: str) -> int:
+    """Write the ``suffix`` sibling of ``path``; return its size."""
+    data = path.read_bytes()
+    if suffix == ".gz":
+        packed = gzip.compress(data, compresslevel=9, mtime=0)
+    else:
+        packed = brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+    path.with_name(path.name + suffix).write_bytes(packed)
+    return len(packed)
+
+
+def precompress(paths: Sequence[Path], pool_size: int = 64 * 1024) -> List[Tuple[Path, Dict[str, int]]]:
+    """Write ``.gz`` and ``.br`` siblings of files at maximum compression.
+
+    Each (file, codec) pair is a job: those of files of at least ``pool_size``
+    bytes run in a process pool (so a large page is gzipped and brotli-encoded
+    in parallel), the others inline, where the pool would cost more than it
+    saves.
+
+    Returns:
+        ``(path, {suffix: size})`` per file, in the order given.
+
+    Raises:
+        ImportError: If the ``brotli`` package is not installed.
+    """
+    if brotli is None:
+        raise ImportError("Precompression needs the brotli package (pip install brotli)")
+    jobs = [(path, suffix) for path in paths for suffix in SUFFIXES]
+    large = [job for job in jobs if job[0].stat().st_size >= pool_size]
+    sizes: Dict[Tuple[Path, str], int] = {}
+    if len(large) > 1:
+        with ProcessPoolExecutor() as pool:
+            sizes.update(zip(large, pool.map(_compress, *zip(*large))))
+    for job in jobs:
+        if job not in sizes:
+            sizes[job] = _compress(*job)
+    return [(path, {suffix: sizes[path, suffix] for suffix in SUFFIXES}) for path in paths]
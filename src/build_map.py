@@ -11,7 +11,7 @@ Markers:
 - Popup with clickable link
 - Label under the marker
 
-Layers:
+Layers (filters over one set of peaks, see ``LAYERS``):
 - Gipuzkoa (all its mountains + polygon)
 - Navarra  (all its mountains + polygon)
 - Challenge (35) (only challenge peaks + Gipuzkoa polygon in a different color)
@@ -29,12 +29,39 @@ from __future__ import annotations
 
 import html
 import json
-import math
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Sequence, Tuple, Union
 
 import folium
 import pandas as pd
+from folium.plugins import MarkerCluster
+
+from artifacts import precompress, write_page
+from bundle import bundle_assets, walk
+from clustering import build_cluster_levels
+from encoding import check_encoding
+from geodata import load_provinces
+from labels import place_labels
+from elements import (
+    CLIMBED_TEMPLATE,
+    LABEL_TOOLTIP,
+    PIN_ICON,
+    POPUP_TEMPLATE,
+    GeoJsonStore,
+    LabelStyle,
+    PeakCanvas,
+    PeakCluster,
+    PeakClusterIndex,
+    PeakStore,
+    PeakView,
+    PinSprite,
+    RegionLayer,
+    TopologyStore,
+    cluster_options,
+    pin_html,
+)
+from geometry import build_pyramid, count_vertices, round_shape
+from topology import build_topology
 
 # --- Paths ---
 ROOT = Path(__file__).resolve().parent.parent
@@ -44,6 +71,8 @@ OUT_HTML = ROOT / "docs" / "index.html"
 PROVINCES_FILE = DATA / "georef-spain-provincia.json"
 MOUNTAINS_FILE = DATA / "mountains_data.txt"
 JAPAN_FILE = DATA / "world.json"
+# Local copies of the CDN assets, filled by scripts/vendor_assets.py.
+VENDOR_DIR = ROOT / "vendor"
 
 # --- Map config ---
 MAP_CENTER: Tuple[float, float] = (43.1733, -2.1369)
@@ -54,30 +83,144 @@ COLOR_JAPAN = "red"
 COLOR_CHALLENGE = "purple"
 ICON_CLIMBED: Dict[bool, str] = {True: "green", False: "red"}
 
+# --- Geometry ---
+# Polygons are simplified before rendering; 0.0005° (~50 m) is below one pixel
+# at ``MAP_ZOOM``. Use 0 to embed the source resolution.
+SIMPLIFY_TOLERANCE = 0.0005
+SIMPLIFY_METHOD = "dp"  # "dp" (Douglas–Peucker) or "vw" (Visvalingam–Whyatt)
+# Levels of detail as (min_zoom, tolerance in degrees). The page swaps levels on
+# zoom, so country-scale views draw coarse outlines and full detail is only
+# loaded from ``MAP_ZOOM`` on. Use a single level to disable the pyramid.
+LOD_LEVELS: Tuple[Tuple[int, float], ...] = (
+    (0, 0.05),
+    (5, 0.01),
+    (8, 0.002),
+    (MAP_ZOOM, SIMPLIFY_TOLERANCE),
+)
+# "topojson" encodes all regions into one topology so shared borders (e.g.
+# Gipuzkoa/Navarra) are emitted once; "geojson" embeds one payload per region.
+GEOMETRY_FORMAT = "topojson"
+# Decimal places kept in the page: 5 (~1.1 m) for polygon vertices (also the
+# TopoJSON grid), 6 (~0.11 m) for peak markers. Sources carry 15-16 digits.
+POLYGON_PRECISION = 5
+MARKER_PRECISION = 6
+# Polygon payload encoding, decoded in the browser: "polyline" (Google encoded
+# polyline, smallest), "int32" (base64 delta-encoded Int32 typed arrays) or
+# "json" (plain coordinate arrays). Both packed encodings are 32-bit, which
+# allows a POLYGON_PRECISION of 6 decimals at most.
+GEOMETRY_ENCODING = "polyline"
+
+# --- Layers ---
+# Overlay layers as (name, filter, shown initially, region polygon, colour). A
+# layer holds the peaks whose columns equal every value of its filter, so
+# overlapping lists (e.g. the challenge peaks of a province) are just filters.
+LAYERS: Tuple[Tuple[str, Dict[str, Any], bool, str | None, str], ...] = (
+    ("Challenge (35)", {"province": "Gipuzkoa", "challenge": True}, True, "Gipuzkoa", COLOR_CHALLENGE),
+    ("Gipuzkoa", {"province": "Gipuzkoa"}, False, "Gipuzkoa", COLOR_GIPUZKOA),
+    ("Navarra", {"province": "Navarra"}, False, "Navarra", COLOR_NAVARRA),
+    ("Japan", {"province": "Japan"}, True, "Japan", COLOR_JAPAN),
+)
+
+# --- Markers ---
+# "data" emits every peak once in a compact array and builds the markers in the
+# browser; layers show and hide the same marker instances. "folium" adds a
+# folium.Marker pin and label per peak and layer.
+MARKER_MODE = "data"
+# "sprite" draws pins as inline SVG symbols (see elements.PinSprite), with a
+# star instead of the flag on challenge peaks; "awesome" uses awesome-markers
+# and its glyphicon font.
+MARKER_ICON = "sprite"
+# "tooltip" binds each name to its pin as a permanent tooltip (one Leaflet layer
+# per peak); "marker" draws it as a second DivIcon marker under the pin.
+LABEL_MODE = "tooltip"
+# Labels are placed at build time: each name is shown from the lowest zoom at
+# which it does not overlap a label of higher priority. Priority is given by
+# these columns, in order, higher values first (e.g. add "elevation").
+# Needs "data" MARKER_MODE; False shows every label at every zoom.
+LABEL_PLACEMENT = True
+LABEL_PRIORITY: Tuple[str, ...] = ("challenge",)
+# Layers clustered in the browser with Leaflet.markercluster, as layer name ->
+# (cluster radius in px, zoom from which clustering turns off). Clustered peaks
+# are always labelled with tooltips. E.g. {"Navarra": (80, 12)}.
+CLUSTER_LAYERS: Dict[str, Tuple[int, int]] = {}
+# "index" computes the cluster hierarchy at build time and the page draws the
+# nodes of the current zoom and viewport; "client" clusters in the browser with
+# Leaflet.markercluster (always the case in "folium" MARKER_MODE).
+CLUSTERING = "index"
+# Layers drawn as circle markers on a single Canvas renderer (coloured like
+# ICON_CLIMBED), as layer name -> zoom from which peak names are shown. Meant
+# for dense layers; needs "data" MARKER_MODE and takes precedence over
+# CLUSTER_LAYERS. E.g. {"Navarra": 12}.
+CANVAS_LAYERS: Dict[str, int] = {}
+# Viewport sharding ("data" MARKER_MODE): with SHARD_ZOOM set, peaks are not
+# embedded in the page but written next to it as one JSON file per quadtree
+# tile of that zoom (SHARD_DIR/<z>-<x>-<y>.json). The page fetches the tiles in
+# view, from SHARD_MIN_ZOOM on, and keeps them. Needs an HTTP server (e.g.
+# GitHub Pages or ``python -m http.server``) and no clustered or canvas layers.
+SHARD_ZOOM: int | None = None
+SHARD_MIN_ZOOM = 6
+SHARD_DIR = "peaks"
+# Hidden layers (show=False) are not embedded: the region borders only they
+# draw and the peaks only they contain are saved to LAZY_DIR next to the page
+# and fetched the first time the layer is enabled. Like SHARD_ZOOM, needs an
+# HTTP server.
+LAZY_HIDDEN_LAYERS = True
+LAZY_DIR = "layers"
+
+# --- Page assets ---
+# "full" keeps folium's default CDN assets (Bootstrap 5, jQuery, Font Awesome,
+# ...); "lean" only loads what the page uses: Leaflet, awesome-markers and its
+# glyphicon font for "awesome" MARKER_ICON pins, and jQuery when folium popups
+# are rendered ("folium" MARKER_MODE).
+ASSET_PROFILE = "lean"
+# Offline bundle: None links the assets from their CDNs; "local" saves the
+# vendored copies (VENDOR_DIR) next to the page under content-hashed names
+# (ASSET_DIR/), and "inline" embeds them in the page. Either way the page only
+# reaches out to the tile server.
+ASSET_BUNDLE: str | None = None
+ASSET_DIR = "assets"
+
+# --- Output ---
+# Minify the page: markup, inline scripts and stylesheets (see artifacts.py).
+MINIFY = True
+# Write .gz and .br siblings of the page and of the files saved next to it at
+# maximum compression (needs the brotli package), for servers that send
+# precompressed files (e.g. nginx gzip_static). GitHub Pages compresses on its
+# own and ignores them.
+PRECOMPRESS = False
+
+# A region ready to draw: a reference (store, region id) into the map's
+# geometry store. Layers that reuse a region share its single payload.
+RegionRef = Tuple[Union[GeoJsonStore, TopologyStore], str]
+
 
 def add_poly(
     group: folium.FeatureGroup,
-    data: Dict[str, Any],
+    region: RegionRef,
     fill_color: str,
     border_color: str,
 ) -> None:
-    """Add a filled polygon (GeoJSON) to a Folium layer.
+    """Add a filled polygon to a Folium layer, by reference to a geometry store.
 
-    This is a thin wrapper over :class:`folium.GeoJson` that applies a consistent
-    style (fill, opacity, stroke) so province polygons look uniform across the map.
+    Applies a consistent style (fill, opacity, stroke) so province polygons look
+    uniform across the map. The geometry itself lives once in the page (see
+    :func:`prepare_regions`); the added :class:`RegionLayer` only carries the
+    style and the region id, and draws the level of detail matching the zoom.
 
     Args:
         group: Target layer to which the polygon will be added.
-        data: A GeoJSON-like mapping (already extracted from the provinces file).
+        region: ``(store, region_id)`` as returned by :func:`prepare_regions`.
         fill_color: Fill color for the polygon body.
         border_color: Stroke color for the polygon outline.
 
     Side Effects:
-        Mutates ``group`` by attaching a new GeoJSON object.
+        Mutates ``group`` by attaching a new region layer.
     """
-    folium.GeoJson(
-        data=data,
-        style_function=lambda _: {
+    store, region_id = region
+    RegionLayer(
+        store,
+        region_id,
+        {
             "fillColor": fill_color,
             "fillOpacity": 0.3,
             "color": border_color,
@@ -93,17 +236,22 @@ def add_marker_and_label(
     name: str | None,
     url: str | None,
     color: str,
-    group: folium.FeatureGroup,
+    group: folium.FeatureGroup | MarkerCluster,
+    label: str | None = None,
+    climbed_date: str | None = None,
+    challenge: bool = False,
 ) -> None:
     """Add a mountain marker plus a static text label at the same coordinates.
 
     Two markers are added:
-      1) A standard pin with a colored icon and a clickable popup linking to ``url``.
+      1) A standard pin with a colored icon and a clickable popup linking to ``url``
+         (the shared ``POPUP_TEMPLATE``).
       2) A label rendered via :class:`folium.DivIcon` placed slightly below the pin.
 
     The duplication is deliberate: Folium does not provide an out-of-the-box
     "marker with subtitle" primitive. This pattern keeps label styling simple while
-    preserving interactive popups on click.
+    preserving interactive popups on click. With ``LABEL_MODE = "tooltip"`` the
+    label is instead a permanent tooltip on the pin and only one marker is added.
 
     Args:
         lat: Latitude of the mountain.
@@ -112,28 +260,42 @@ def add_marker_and_label(
         url: Optional external link; will be HTML-escaped. ``#`` if absent.
         color: Icon color (e.g., "green" for climbed, "red" otherwise).
         group: Layer to attach both the pin and its label to.
+        label: ``"marker"`` or ``"tooltip"``; defaults to ``LABEL_MODE``.
+        climbed_date: Shown in the popup when given; will be HTML-escaped.
+        challenge: Draw the challenge variant of the pin (``MARKER_ICON =
+            "sprite"`` only).
 
     Side Effects:
-        Mutates ``group`` by attaching two markers.
+        Mutates ``group`` by attaching one or two markers.
     """
     safe_name = html.escape(str(name or ""))
     safe_url = html.escape(str(url or "#"))
 
-    popup_html = f"""
-    <div style="text-align:center; font-weight:bold">
-        <a href="{safe_url}" target="_blank" rel="noopener noreferrer" style="color:black">
-            {safe_name}
-        </a>
-    </div>
-    """
+    climbed = CLIMBED_TEMPLATE.format(date=html.escape(climbed_date)) if climbed_date else ""
+    popup_html = POPUP_TEMPLATE.format(name=safe_name, url=safe_url, climbed=climbed)
 
     # Interactive pin
-    folium.Marker(
+    if MARKER_ICON == "sprite":
+        icon = folium.DivIcon(
+            html=pin_html(color, challenge),
+            icon_size=PIN_ICON["iconSize"],
+            icon_anchor=PIN_ICON["iconAnchor"],
+            popup_anchor=PIN_ICON["popupAnchor"],
+            class_name=PIN_ICON["className"],
+        )
+    else:
+        icon = folium.Icon(color=color, icon="flag")
+    pin = folium.Marker(
         [lat, lon],
-        icon=folium.Icon(color=color, icon="flag"),
+        icon=icon,
         popup=folium.Popup(popup_html, max_width=250),
     ).add_to(group)
 
+    if (label or LABEL_MODE) == "tooltip":
+        # Label bound to the pin itself, styled by LabelStyle
+        pin.add_child(folium.Tooltip(safe_name, sticky=False, **LABEL_TOOLTIP))
+        return
+
     # Readable label under the pin (non-interactive)
     folium.Marker(
         [lat, lon],
@@ -149,30 +311,69 @@ def add_marker_and_label(
     ).add_to(group)
 
 
-def load_provinces(name: str, path: Path) -> tuple[Dict[str, Any], Dict[str, Any]]:
-    """Load province polygons and return the GeoJSON shapes for Gipuzkoa and Navarra.
+def _json_size(obj: Any) -> int:
+    """Return the size in bytes of ``obj`` serialized as compact JSON."""
+    return len(json.dumps(obj, separators=(",", ":")))
+
 
-    The provinces file contains a list of province records where each record has
-    a ``prov_name`` and a nested ``geo_shape``. We extract the shapes by name.
+def prepare_regions(
+    m: folium.Map, shapes: Dict[str, Dict[str, Any]], lazy: Sequence[str] = (), src: str | None = None
+) -> Dict[str, RegionRef]:
+    """Simplify and round region shapes and store them once in the page.
+
+    Every level in ``LOD_LEVELS`` is simplified with ``SIMPLIFY_METHOD`` and
+    rounded to ``POLYGON_PRECISION`` decimals; vertex counts and payload sizes
+    are printed, since they are the main lever on page weight. All shapes go
+    into a single store attached to ``m``: a :class:`TopologyStore` (quantized
+    on a ``10 ** -POLYGON_PRECISION`` grid) in ``"topojson"`` mode, a
+    :class:`GeoJsonStore` otherwise.
 
     Args:
-        path: Filesystem path to the provinces GeoJSON file.
+        m: Map that receives the shared store (must precede the layers using it).
+        shapes: Region name to GeoJSON shape at source resolution.
+        lazy: Regions whose geometry is saved to ``src`` (relative to the
+            page) and fetched when first drawn instead of being embedded. In
+            ``"topojson"`` mode only the arcs no embedded region uses are.
+        src: Payload file of the ``lazy`` regions.
 
     Returns:
-        A pair ``(gipuzkoa_shape, navarra_shape)`` suitable to feed into Folium.
+        Region name to the reference expected by :func:`add_poly`.
 
     Raises:
-        ``StopIteration`` if either province cannot be found (input is malformed).
+        ValueError: If ``GEOMETRY_ENCODING`` is unknown or cannot hold
+            ``POLYGON_PRECISION`` decimals.
     """
-    with path.open(encoding="utf-8-sig") as f:
-        data = json.load(f)
-
-    if name == "Japan":
-        return next(x["geometry"] for x in data["features"] if x["properties"]["NAME"] == name)
-    else:
-        return next(x["geo_shape"] for x in data if x["prov_name"] == name)
-
-    
+    check_encoding(GEOMETRY_ENCODING, POLYGON_PRECISION)
+    source = sum(count_vertices(s) for s in shapes.values())
+    if GEOMETRY_FORMAT == "topojson":
+        quantum = 10.0**-POLYGON_PRECISION
+        topology, levels = build_topology(shapes, LOD_LEVELS, quantum, SIMPLIFY_METHOD)
+        store = TopologyStore(topology, levels, GEOMETRY_ENCODING, src, lazy).add_to(m)
+        for name, shape in shapes.items():
+            rounded = round_shape(shape, POLYGON_PRECISION)
+            print(
+                f"{name}: {_json_size(shape) / 1024:.1f} KB → {_json_size(rounded) / 1024:.1f} KB "
+                f"rounded to {POLYGON_PRECISION} decimals"
+            )
+        counts = ", ".join(f"z{z}+: {len(ids)} arcs, {sum(map(len, arcs))} vertices" for z, ids, arcs in levels)
+        print(
+            f"Topology of {len(shapes)} regions: {source} vertices → {len(topology['arcs'])} arcs, "
+            f"{counts} ({SIMPLIFY_METHOD}); {_json_size(levels) / 1024:.1f} KB of quantized arcs"
+        )
+        return {name: (store, name) for name in shapes}
+
+    pyramids = {}
+    for name, shape in shapes.items():
+        levels = build_pyramid(shape, LOD_LEVELS, SIMPLIFY_METHOD)
+        pyramids[name] = [(z, round_shape(s, POLYGON_PRECISION)) for z, s in levels]
+        counts = ", ".join(f"z{z}+: {count_vertices(s)}" for z, s in pyramids[name])
+        print(
+            f"{name}: {count_vertices(shape)} vertices → {counts} ({SIMPLIFY_METHOD}); "
+            f"{_json_size(levels) / 1024:.1f} KB → {_json_size(pyramids[name]) / 1024:.1f} KB "
+            f"rounded to {POLYGON_PRECISION} decimals"
+        )
+    store = GeoJsonStore(pyramids, GEOMETRY_ENCODING, POLYGON_PRECISION, src, lazy).add_to(m)
+    return {name: (store, name) for name in shapes}
 
 
 def load_mountains(path: Path) -> pd.DataFrame:
@@ -181,6 +382,9 @@ def load_mountains(path: Path) -> pd.DataFrame:
     The input is expected to be a CSV (``.txt`` is fine as long as it is CSV-formatted)
     with at least these columns: ``name, lat, lon, climbed, url, province, challenge``.
 
+    Province names are stripped and ``challenge`` is read as a boolean so that
+    layer filters (see ``LAYERS``) can compare them directly.
+
     Args:
         path: Filesystem path to the mountains CSV/TXT file.
 
@@ -195,20 +399,43 @@ def load_mountains(path: Path) -> pd.DataFrame:
     missing = [c for c in required if c not in df.columns]
     if missing:
         raise ValueError(f"CSV missing columns: {missing}")
+    df["province"] = df["province"].fillna("").astype(str).str.strip()
+    df["challenge"] = df["challenge"].fillna(False).astype(bool)
     return df
 
 
+def _texts(column: pd.Series) -> List[str]:
+    """Return a text column as strings, with ``""`` for missing values."""
+    return ["" if pd.isna(v) else str(v) for v in column]
+
+
+def select(df: pd.DataFrame, where: Dict[str, Any]) -> List[int]:
+    """Return the row positions of ``df`` matching every ``column == value`` of ``where``."""
+    mask = pd.Series(True, index=df.index)
+    for column, value in where.items():
+        mask &= df[column] == value
+    return [i for i, keep in enumerate(mask) if keep]
+
+
 def build_map() -> folium.Map:
     """Construct the interactive Folium map with layers and markers.
 
     Pipeline:
         1) Create the base map and add the base tile layer.
-        2) Load province GeoJSON and create three feature groups: Gipuzkoa, Navarra,
-           and Challenge (35).
-        3) Render province polygons into their groups using consistent styles.
-        4) Load mountain rows, skip any without valid coordinates, and add markers to
-           their respective province group. Challenge mountains are also mirrored into
-           the Challenge group.
+        2) Load province GeoJSON and simplify and encode it (see
+           :func:`prepare_regions`); regions drawn only by hidden layers go to
+           a separate store loaded on demand.
+        3) Load mountain rows, skip any without valid coordinates and round
+           them to ``MARKER_PRECISION``, printing the bytes this saves per
+           layer. In ``"data"`` ``MARKER_MODE`` all
+           peaks go once into a shared :class:`PeakStore`, with the zoom from
+           which their label is drawn (see :func:`labels.place_labels`).
+        4) Create one feature group per entry of ``LAYERS``, with its province
+           polygon and the peaks matching its filter: a :class:`PeakView` over
+           the store, or one pin and label per peak in ``"folium"`` mode.
+           Layers in ``CLUSTER_LAYERS`` cluster their peaks instead, from a
+           hierarchy built here in ``"index"`` ``CLUSTERING``, and layers in
+           ``CANVAS_LAYERS`` draw them as circles on a Canvas renderer.
         5) Attach a non-collapsed layer control for easy toggling.
 
     Returns:
@@ -217,49 +444,178 @@ def build_map() -> folium.Map:
     m = folium.Map(location=MAP_CENTER, zoom_start=MAP_ZOOM, tiles=None)
     folium.TileLayer("OpenStreetMap", name="Base map").add_to(m)
 
-    gip_geo = load_provinces("Gipuzkoa",PROVINCES_FILE)
-    nav_geo = load_provinces("Navarra", PROVINCES_FILE)
-    japan_geo = load_provinces("Japan", JAPAN_FILE)
+    shapes = {
+        "Gipuzkoa": load_provinces("Gipuzkoa", PROVINCES_FILE),
+        "Navarra": load_provinces("Navarra", PROVINCES_FILE),
+        "Japan": load_provinces("Japan", JAPAN_FILE),
+    }
+    # Regions only drawn by hidden layers go to a payload fetched on first toggle.
+    shown = {region for _, _, show, region, _ in LAYERS if show}
+    lazy = {n for n in shapes if n not in shown} if LAZY_HIDDEN_LAYERS else set()
+    regions = prepare_regions(m, shapes, sorted(lazy), f"{LAZY_DIR}/regions.json" if lazy else None)
 
-    fg_chal = folium.FeatureGroup(name="Challenge (35)").add_to(m)
-    fg_gip = folium.FeatureGroup(name="Gipuzkoa", show=False).add_to(m)
-    fg_nav = folium.FeatureGroup(name="Navarra", show=False).add_to(m)
-    fg_japan = folium.FeatureGroup(name="Japan").add_to(m)
+    df = load_mountains(MOUNTAINS_FILE)
+    # Skip rows without valid coordinates
+    df = df[df["lat"].notna() & df["lon"].notna()].reset_index(drop=True)
+    members = {name: select(df, where) for name, where, *_ in LAYERS}
+    before = [_json_size([lat, lon]) for lat, lon in zip(df["lat"], df["lon"])]
+    df["lat"] = df["lat"].round(MARKER_PRECISION)
+    df["lon"] = df["lon"].round(MARKER_PRECISION)
+    after = [_json_size([lat, lon]) for lat, lon in zip(df["lat"], df["lon"])]
+    for name, rows in members.items():
+        print(
+            f"Layer {name}: {len(rows)} peaks, {sum(before[i] for i in rows)} → {sum(after[i] for i in rows)} "
+            f"coordinate bytes rounded to {MARKER_PRECISION} decimals"
+        )
+
+    colors = [ICON_CLIMBED[bool(c)] for c in df["climbed"]]
+    pins = list(zip(colors, (bool(c) for c in df["challenge"])))
+    if MARKER_ICON == "sprite":
+        PinSprite(sorted(set(pins))).add_to(m)
+    # Optional column: shown in popups when present.
+    dates = _texts(df["climbed_date"]) if "climbed_date" in df else [""] * len(df)
+    if MARKER_MODE == "data":
+        names = [str(n or "") for n in df["name"]]
+        label_zooms = [0] * len(df)
+        if LABEL_PLACEMENT:
+            order = list(df.sort_values(list(LABEL_PRIORITY), ascending=False, kind="stable").index)
+            label_zooms = place_labels(df["lat"], df["lon"], names, order)
+            placed = ", ".join(f"z{z}: {sum(lz <= z for lz in label_zooms)}" for z in (6, 8, 10, 12, 14))
+            print(f"Labels placed without overlap: {placed} of {len(df)}")
+        if SHARD_ZOOM is not None and (CLUSTER_LAYERS or CANVAS_LAYERS):
+            raise ValueError("SHARD_ZOOM cannot be combined with CLUSTER_LAYERS or CANVAS_LAYERS")
+        # Bit k of a peak's mask: the peak belongs to LAYERS[k].
+        masks = [0] * len(df)
+        for k, ids in enumerate(members.values()):
+            for i in ids:
+                masks[i] |= 1 << k
+        # Peaks only in hidden, unclustered layers travel in those layers' payloads.
+        eager = set()
+        for name, _, show, *_ in LAYERS:
+            if show or name in CLUSTER_LAYERS or name in CANVAS_LAYERS:
+                eager.update(members[name])
+        lazy_peaks = LAZY_HIDDEN_LAYERS and SHARD_ZOOM is None
+        omit = [i for i in range(len(df)) if i not in eager] if lazy_peaks else []
+        store = PeakStore(
+            list(zip(df["lat"], df["lon"], names, _texts(df["url"]), pins, label_zooms, dates)),
+            LABEL_MODE,
+            masks,
+            SHARD_ZOOM,
+            SHARD_MIN_ZOOM,
+            SHARD_DIR,
+            omit,
+            MARKER_ICON == "sprite",
+        ).add_to(m)
+        if store.shards is not None:
+            print(f"{len(df)} peaks in {len(store.shards)} shards at zoom {SHARD_ZOOM}")
+    if LABEL_MODE == "tooltip" or CLUSTER_LAYERS or CANVAS_LAYERS:
+        LabelStyle().add_to(m)
+
+    for k, (name, where, show, region, color) in enumerate(LAYERS):
+        group = folium.FeatureGroup(name=name, show=show).add_to(m)
+        if region:
+            add_poly(group, regions[region], fill_color=color, border_color=color)
+        ids = members[name]
+        cluster = CLUSTER_LAYERS.get(name)
+        if MARKER_MODE == "data":
+            if name in CANVAS_LAYERS:
+                PeakCanvas(store, ids, CANVAS_LAYERS[name]).add_to(group)
+            elif store.shards is not None:
+                PeakView(store, k).add_to(group)
+            elif not cluster:
+                src = f"{LAZY_DIR}/layer-{k}.json" if store.omitted.intersection(ids) else None
+                PeakView(store, ids, src).add_to(group)
+            elif CLUSTERING == "index":
+                rows = df.iloc[ids]
+                levels = build_cluster_levels(rows["lat"], rows["lon"], ids, *cluster, MARKER_PRECISION)
+                print(f"{name} clusters: " + ", ".join(f"z{z}+: {len(nodes)}" for z, nodes in levels))
+                PeakClusterIndex(store, levels).add_to(group)
+            else:
+                PeakCluster(store, ids, *cluster).add_to(group)
+            continue
+        target = MarkerCluster(control=False, **cluster_options(*cluster)).add_to(group) if cluster else group
+        for i in ids:
+            r = df.iloc[i]
+            add_marker_and_label(
+                r["lat"],
+                r["lon"],
+                r.get("name"),
+                r.get("url"),
+                colors[i],
+                target,
+                "tooltip" if cluster else None,
+                dates[i],
+                pins[i][1],
+            )
 
-    add_poly(fg_gip, gip_geo, fill_color=COLOR_GIPUZKOA, border_color=COLOR_GIPUZKOA)
-    add_poly(fg_chal, gip_geo, fill_color=COLOR_CHALLENGE, border_color=COLOR_CHALLENGE)
-    add_poly(fg_nav, nav_geo, fill_color=COLOR_NAVARRA, border_color=COLOR_NAVARRA)
-    add_poly(fg_japan, japan_geo, fill_color=COLOR_JAPAN, border_color=COLOR_JAPAN)
+    folium.LayerControl(collapsed=False).add_to(m)
+    if ASSET_PROFILE == "lean":
+        use_lean_assets(m)
+    return m
 
-    df = load_mountains(MOUNTAINS_FILE)
 
-    for _, r in df.iterrows():
-        lat, lon = r.get("lat"), r.get("lon")
+def use_lean_assets(m: folium.Map) -> None:
+    """Restrict the map's CDN assets to those its elements need.
 
-        # Skip rows without valid coordinates
-        if (
-            lat is None
-            or lon is None
-            or (isinstance(lat, float) and math.isnan(lat))
-            or (isinstance(lon, float) and math.isnan(lon))
-        ):
-            continue
+    Folium links Bootstrap, jQuery and two icon fonts into every page. Of
+    those, awesome-markers pins only use glyphicons (sprite pins need none),
+    and only folium's popups (and ``objects_to_stay_in_front``) call jQuery.
+    Plugins such as Leaflet.markercluster add their own assets and are
+    unaffected.
 
-        prov = (r.get("province") or "").strip()
-        color = ICON_CLIMBED[bool(r.get("climbed", False))]
-        is_chal = bool(r.get("challenge", False))
+    Raises:
+        ValueError: If folium no longer links one of the needed assets under
+            the expected name.
 
-        if prov == "Gipuzkoa":
-            add_marker_and_label(lat, lon, r.get("name"), r.get("url"), color, fg_gip)
-            if is_chal:
-                add_marker_and_label(lat, lon, r.get("name"), r.get("url"), color, fg_chal)
-        elif prov == "Navarra":
-            add_marker_and_label(lat, lon, r.get("name"), r.get("url"), color, fg_nav)
-        elif prov == "Japan":
-            add_marker_and_label(lat, lon, r.get("name"), r.get("url"), color, fg_japan)
+    Side Effects:
+        Replaces ``m.default_js`` and ``m.default_css`` on the instance.
+    """
+    elements = list(walk(m))
+    pins = any(isinstance(e, folium.Icon) or isinstance(e, PeakStore) and not e.sprite for e in elements)
+    jquery = m.objects_to_stay_in_front or any(isinstance(e, folium.Popup) for e in elements)
+    js, css = {"leaflet"}, {"leaflet_css"}
+    if pins:
+        js.add("awesome_markers")
+        css.update(("awesome_markers_css", "glyphicons_css"))
+    if jquery:
+        js.add("jquery")
+    missing = (js - {name for name, _ in m.default_js}) | (css - {name for name, _ in m.default_css})
+    if missing:
+        raise ValueError(f"Assets not linked by this folium version: {sorted(missing)}")
+    m.default_js = [(name, url) for name, url in m.default_js if name in js]
+    m.default_css = [(name, url) for name, url in m.default_css if name in css]
 
-    folium.LayerControl(collapsed=False).add_to(m)
-    return m
+
+def save_external(m: folium.Map, directory: Path, owned: Sequence[str] = ()) -> List[Path]:
+    """Write the files that the elements of ``m`` load at runtime.
+
+    Elements list them in an ``external`` mapping of path (relative to the
+    page) to JSON-serializable payload: peak shards, hidden layers' regions
+    and peaks.
+
+    Args:
+        m: Map whose elements are saved, after it is built.
+        directory: Directory of the page.
+        owned: Subdirectories of ``directory`` that only hold these files.
+            Any other file in them (payloads of an earlier build and their
+            precompressed siblings) is removed.
+
+    Returns:
+        The files written.
+    """
+    files = {}
+    for element in walk(m):
+        for name, payload in getattr(element, "external", {}).items():
+            files[directory / name] = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    for subdir in owned:
+        if (directory / subdir).is_dir():
+            for path in (directory / subdir).iterdir():
+                if path.is_file() and path not in files:
+                    path.unlink()
+    for path, data in files.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return list(files)
 
 
 def main() -> None:
@@ -267,12 +623,41 @@ def main() -> None:
 
     Ensures the output directory exists (``parents=True`` to create missing
     directories; ``exist_ok=True`` to avoid errors if already present), then builds
-    and saves the map. Prints the absolute path of the generated file for quick
-    inspection when run from the CLI.
+    and saves the map (streamed, see :func:`artifacts.write_page`), with the
+    payload files of its elements next to it (see :func:`save_external`; stale
+    ones in ``LAZY_DIR`` and ``SHARD_DIR`` are removed) and,
+    with ``ASSET_BUNDLE`` set, its vendored assets (see
+    :func:`bundle.bundle_assets`). The page is minified with ``MINIFY``, and
+    every text file gets precompressed siblings with ``PRECOMPRESS``.
+    Prints the absolute path of the generated file for quick inspection when run
+    from the CLI.
     """
     OUT_HTML.parent.mkdir(parents=True, exist_ok=True)
     m = build_map()
-    m.save(str(OUT_HTML))
+    assets: List[Path] = []
+    if ASSET_BUNDLE is not None:
+        if ASSET_BUNDLE not in ("local", "inline"):
+            raise ValueError(f"Unknown ASSET_BUNDLE: {ASSET_BUNDLE!r}")
+        out_dir = OUT_HTML.parent if ASSET_BUNDLE == "local" else None
+        size, assets = bundle_assets(m, VENDOR_DIR, out_dir, ASSET_DIR)
+        print(f"Assets bundled from {VENDOR_DIR} ({ASSET_BUNDLE}, {size / 1024:.1f} KB)")
+    rendered, written = write_page(m, OUT_HTML, MINIFY)
+    if MINIFY:
+        print(f"Page minified: {rendered / 1024:.1f} → {written / 1024:.1f} KB")
+    paths = save_external(m, OUT_HTML.parent, (LAZY_DIR, SHARD_DIR))
+    if paths:
+        size = sum(path.stat().st_size for path in paths)
+        print(f"{len(paths)} payload files saved next to the map ({size / 1024:.1f} KB)")
+    if PRECOMPRESS:
+        paths += [p for p in assets if p.suffix in (".js", ".css", ".svg")]
+        results = precompress([OUT_HTML, *paths])
+        for label, group in (("page", results[:1]), (f"{len(results) - 1} other files", results[1:])):
+            if group:
+                size = sum(path.stat().st_size for path, _ in group)
+                packed = ", ".join(
+                    f"{suffix} {sum(sizes[suffix] for _, sizes in group) / 1024:.1f} KB" for suffix in group[0][1]
+                )
+                print(f"Precompressed {label}: {size / 1024:.1f} KB → {packed}")
     print(f"Map saved → {OUT_HTML.resolve()}")
 
 
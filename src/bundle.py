@@ -0,0 +1,160 @@
+"""
+Offline bundling of the page's CDN assets.
+
+Folium links Leaflet, its plugins and their stylesheets from public CDNs, so
+the page pays DNS and TLS round trips to several third-party hosts before the
+map can draw, and does not work at all without network access.
+:func:`bundle_assets` replaces those links with copies vendored with the
+project (see ``scripts/vendor_assets.py``). The copies are either saved next
+to the page under content-hashed names, which can be cached forever, or
+inlined into the page. The images and fonts referenced by the stylesheets are
+bundled the same way.
+
+The vendored copy of ``https://host/path`` lives at ``<vendor_dir>/host/path``.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import mimetypes
+import re
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from branca.element import Element
+from folium.elements import JSCSSMixin
+
+# A ``url(...)`` reference in a stylesheet, quoted or not.
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _is_resource(ref: str) -> bool:
+    """Whether a ``url(...)`` reference loads a file (not ``data:`` or ``#id``)."""
+    return not ref.startswith(("data:", "#"))
+
+
+def walk(element: Any) -> Iterator[Any]:
+    """Yield ``element`` and all its descendants, in document order."""
+    stack = [element]
+    while stack:
+        element = stack.pop()
+        stack.extend(reversed(list(element._children.values())))
+        yield element
+
+
+def vendor_path(url: str, vendor_dir: Path) -> Path:
+    """Location of the vendored copy of ``url`` (query and fragment ignored)."""
+    parts = urlsplit(url)
+    return vendor_dir / parts.netloc / parts.path.lstrip("/")
+
+
+def css_urls(css: str, base: str) -> List[str]:
+    """Absolute URLs of the resources referenced by the stylesheet at ``base``."""
+    return [urljoin(base, ref) for _, ref in CSS_URL.findall(css) if _is_resource(ref)]
+
+
+def _read(url: str, vendor_dir: Path) -> bytes:
+    path = vendor_path(url, vendor_dir)
+    if not path.is_file():
+        raise FileNotFoundError(f"{url} is not vendored (expected {path}); run scripts/vendor_assets.py")
+    return path.read_bytes()
+
+
+def _hashed(url: str, data: bytes) -> str:
+    """File name of ``url`` with a content hash, e.g. ``leaflet.0123456789.js``."""
+    name = PurePosixPath(urlsplit(url).path)
+    return f"{name.stem}.{hashlib.sha256(data).hexdigest()[:10]}{name.suffix}"
+
+
+def _bundle_css(css: str, base: str, vendor_dir: Path, files: Dict[str, bytes] | None) -> str:
+    """Point the ``url(...)`` references of a stylesheet at bundled copies.
+
+    Resources are added to ``files`` under hashed names (relative to the
+    stylesheet, saved in the same directory) or, when ``files`` is ``None``,
+    inlined as data URIs.
+    """
+
+    def bundle(match: re.Match) -> str:
+        ref = match.group(2)
+        if not _is_resource(ref):
+            return match.group(0)
+        url = urljoin(base, ref)
+        data = _read(url, vendor_dir)
+        if files is None:
+            mime = mimetypes.guess_type(urlsplit(url).path)[0] or "application/octet-stream"
+            # Keep an SVG font's "#id"; a data URI cannot take the "?#iefix" query.
+            fragment = urlsplit(ref).fragment if "?" not in ref else ""
+            encoded = base64.b64encode(data).decode("ascii")
+            return f'url("data:{mime};base64,{encoded}{"#" + fragment if fragment else ""}")'
+        name = _hashed(url, data)
+        files[name] = data
+        return f'url("{name}{ref[len(ref.split("?")[0].split("#")[0]):]}")'
+
+    return CSS_URL.sub(bundle, css)
+
+
+def bundle_assets(
+    m: Any, vendor_dir: Path, out_dir: Path | None, asset_dir: str = "assets"
+) -> Tuple[int, List[Path]]:
+    """Replace the CDN scripts and stylesheets of a page with vendored copies.
+
+    Covers the assets of every element of ``m`` that links some (the map
+    itself and plugins such as Leaflet.markercluster), so the page needs no
+    third-party host apart from the tile server.
+
+    Args:
+        m: Map to bundle, before it is rendered.
+        vendor_dir: Root of the vendored copies.
+        out_dir: Directory of the page. Assets are saved under
+            ``out_dir / asset_dir`` with content-hashed names and linked from
+            there. ``None`` inlines them into the page instead.
+        asset_dir: Directory of the saved assets, relative to the page. It
+            belongs to the build: files of earlier builds are removed.
+
+    Returns:
+        ``(size, paths)``: the number of bytes bundled and the files saved
+        (none when inlined).
+
+    Raises:
+        FileNotFoundError: If an asset, or a resource of a stylesheet, is not
+            vendored.
+
+    Side Effects:
+        Replaces ``default_js`` and ``default_css`` on the elements of ``m``,
+        adds the inlined assets to the page header, and writes the saved
+        assets, deleting any other file of ``out_dir / asset_dir`` (stale
+        hashed copies and their compressed siblings).
+    """
+    header = m.get_root().header
+    files: Dict[str, bytes] | None = None if out_dir is None else {}
+    bundled: Dict[str, bytes] = {}
+    for element in walk(m):
+        if not isinstance(element, JSCSSMixin):
+            continue
+        for attr, tag in (("default_js", "script"), ("default_css", "style")):
+            links = []
+            for name, url in getattr(element, attr):
+                if url not in bundled:
+                    data = _read(url, vendor_dir)
+                    if tag == "style":
+                        data = _bundle_css(data.decode("utf-8"), url, vendor_dir, files).encode("utf-8")
+                    bundled[url] = data
+                    if files is None:
+                        text = data.decode("utf-8").replace("</" + tag, "<\\/" + tag)
+                        header.add_child(Element(f"<{tag}>{{% raw %}}{text}{{% endraw %}}</{tag}>"), name=name)
+                if files is not None:
+                    hashed = _hashed(url, bundled[url])
+                    files[hashed] = bundled[url]
+                    links.append((name, f"{asset_dir}/{hashed}"))
+            setattr(element, attr, links)
+    if files is None:
+        return sum(len(data) for data in bundled.values()), []
+    directory = out_dir / asset_dir
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in directory.iterdir():
+        if path.is_file() and path.name not in files:
+            path.unlink()
+    for name, data in files.items():
+        (directory / name).write_bytes(data)
+    return sum(len(data) for data in files.values()), [directory / name for name in files]
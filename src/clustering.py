@@ -0,0 +1,128 @@
+"""
+Build-time hierarchical clustering of peaks, in the manner of supercluster.
+
+Clustering markers in the browser (Leaflet.markercluster) costs time on every
+page load, proportional to the number of peaks. :func:`build_cluster_levels`
+does the same work once, at build time: points are projected to Web Mercator
+and, from the finest zoom level down to zoom 0, the nodes of each level are
+greedily merged with their neighbours within a fixed pixel radius, found
+through a grid index whose cells are one radius wide. The page then only draws
+the nodes of the current zoom level that fall in the viewport.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Leaflet tiles are 256 px wide: one world is ``256 * 2 ** z`` px at zoom ``z``.
+TILE_SIZE = 256
+
+# A node of a level: ``[lat, lon, count, ref]``, where ``ref`` is the peak id of
+# a single peak (``count == 1``) or else the zoom at which the cluster splits.
+Node = List[float]
+
+
+def project(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Project degrees to Web Mercator in ``[0, 1]`` world units."""
+    s = np.sin(np.radians(np.clip(lat, -85.05112878, 85.05112878)))
+    return (lon + 180.0) / 360.0, 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+
+def _unproject(x: float, y: float) -> Tuple[float, float]:
+    """Inverse of :func:`project` for a single point."""
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, x * 360.0 - 180.0
+
+
+def _cluster_level(xs: List[float], ys: List[float], radius: float) -> List[List[int]]:
+    """Greedily group points within ``radius`` of each other.
+
+    Points are visited in order; each unvisited point absorbs every unvisited
+    neighbour within ``radius``, looked up in the 3×3 cells around it.
+
+    Returns:
+        The groups, as lists of indices into the input (first index is the seed).
+    """
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        grid.setdefault((int(x // radius), int(y // radius)), []).append(i)
+    r2 = radius * radius
+    done = [False] * len(xs)
+    groups = []
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        if done[i]:
+            continue
+        done[i] = True
+        group = [i]
+        cx, cy = int(x // radius), int(y // radius)
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in grid.get((gx, gy), ()):
+                    if not done[j] and (xs[j] - x) ** 2 + (ys[j] - y) ** 2 <= r2:
+                        done[j] = True
+                        group.append(j)
+        groups.append(group)
+    return groups
+
+
+def build_cluster_levels(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    ids: Sequence[int],
+    radius: int = 80,
+    max_zoom: int = 12,
+    precision: int = 6,
+) -> List[Tuple[int, List[Node]]]:
+    """Compute the cluster nodes of every zoom level from 0 to ``max_zoom``.
+
+    Level ``max_zoom`` holds the peaks themselves; each coarser level merges the
+    nodes of the next finer one that lie within ``radius`` pixels, placing the
+    cluster at their count-weighted centroid (in projected coordinates).
+
+    Args:
+        lat: Latitudes of the peaks.
+        lon: Longitudes of the peaks.
+        ids: Peak ids, carried by the single-peak nodes.
+        radius: Cluster radius in pixels.
+        max_zoom: Zoom level from which peaks are no longer clustered.
+        precision: Decimal places of the node coordinates.
+
+    Returns:
+        ``(min_zoom, nodes)`` pairs, coarsest first, with nodes
+        ``[lat, lon, count, ref]`` (see :data:`Node`). Zoom levels with the
+        same nodes are merged, so the last level, holding the single peaks,
+        starts at or before ``max_zoom``.
+    """
+    x, y = project(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+    xs, ys = x.tolist(), y.tolist()
+    counts = [1] * len(xs)
+    # refs[i]: peak id of a single peak, or the zoom at which the cluster splits.
+    refs: List[int] = [int(i) for i in ids]
+    levels: List[List[Node]] = []
+    for z in range(max_zoom, -1, -1):
+        levels.append(
+            [
+                [*(round(v, precision) for v in _unproject(px, py)), n, ref]
+                for px, py, n, ref in zip(xs, ys, counts, refs)
+            ]
+        )
+        if z == 0:
+            break
+        groups = _cluster_level(xs, ys, radius / (TILE_SIZE * 2 ** (z - 1)))
+        nxs, nys, ncounts, nrefs = [], [], [], []
+        for group in groups:
+            n = sum(counts[i] for i in group)
+            nxs.append(sum(xs[i] * counts[i] for i in group) / n)
+            nys.append(sum(ys[i] * counts[i] for i in group) / n)
+            ncounts.append(n)
+            # A merged cluster splits at zoom ``z``; a lone node keeps its ref.
+            nrefs.append(refs[group[0]] if len(group) == 1 else z)
+        xs, ys, counts, refs = nxs, nys, ncounts, nrefs
+    # Consecutive zooms with the same nodes share one level.
+    merged: List[Tuple[int, List[Node]]] = []
+    for z, nodes in enumerate(levels[::-1]):
+        if not merged or merged[-1][1] != nodes:
+            merged.append((z, nodes))
+    return merged
@@ -0,0 +1,1116 @@
+"""
+Custom Folium elements used by the map builder.
+
+Folium renders every layer from a Jinja template into the page script. The
+elements below follow the same pattern (see ``folium.plugins``) for the few
+things the stock classes cannot express.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from branca.element import MacroElement
+from folium.elements import JSCSSMixin
+from folium.folium import Map
+from folium.plugins import MarkerCluster
+from folium.template import Template
+from folium.utilities import get_obj_in_upper_tree
+
+from clustering import project
+from encoding import pack, pack_geometry
+from geometry import geometry_of
+
+
+def to_js(obj: Any) -> str:
+    """Serialize ``obj`` as a compact JavaScript literal safe to embed in a page.
+
+    Branca re-parses every rendered script as a Jinja template, so ``{{``,
+    ``{%`` and ``{#`` (which packed strings can contain) are written as JSON
+    escapes, and so is ``<`` to keep ``</script>`` out of the payload.
+    """
+    out = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+    for seq, esc in (("<", "\\u003c"), ("{{", "{\\u007b"), ("{%", "{\\u0025"), ("{#", "{\\u0023")):
+        out = out.replace(seq, esc)
+    return out
+
+
+def _arc_ids(arcs: Any) -> set:
+    """Return the indices of the arcs referenced by a TopoJSON geometry."""
+    if isinstance(arcs, int):
+        return {arcs if arcs >= 0 else ~arcs}
+    return set().union(*map(_arc_ids, arcs))
+
+
+# Client-side decoder for payloads packed by :func:`encoding.pack`: returns an
+# array of sequences of [a, b] integer pairs.
+UNPACK_JS = """
+function unpack(p, encoding) {
+    var values = [], out = [], i, k = 0;
+    if (encoding === "int32") {
+        var bin = atob(p.d), view = new DataView(new ArrayBuffer(bin.length));
+        for (i = 0; i < bin.length; i++) view.setUint8(i, bin.charCodeAt(i));
+        for (i = 0; i < bin.length; i += 4) values.push(view.getInt32(i, true));
+    } else {
+        var v = 0, shift = 0, c;
+        for (i = 0; i < p.d.length; i++) {
+            c = p.d.charCodeAt(i) - 63;
+            v |= (c & 0x1f) << shift;
+            shift += 5;
+            if (c < 0x20) {
+                values.push(v & 1 ? ~(v >>> 1) : v >>> 1);
+                v = 0;
+                shift = 0;
+            }
+        }
+    }
+    p.n.forEach(function (n) {
+        var seq = [];
+        for (i = 0; i < n; i++, k += 2) seq.push([values[k], values[k + 1]]);
+        out.push(seq);
+    });
+    return out;
+}
+"""
+
+
+# Returns the ``ready(id, callback)`` function of a store whose regions in
+# ``lazy`` are saved to ``src``: the file is fetched and passed to ``load`` the
+# first time one of them is drawn. A failed fetch is logged and retried on the
+# next call (e.g. when the layer is toggled again).
+DEFERRED_JS = """
+function deferred(src, lazy, load) {
+    var state = "remote", waiting = [];
+    return function ready(id, callback) {
+        if (state === "ready" || lazy.indexOf(id) < 0) return callback();
+        waiting.push(callback);
+        if (state === "loading") return;
+        state = "loading";
+        fetch(src)
+            .then(function (response) {
+                if (!response.ok) throw new Error("HTTP " + response.status);
+                return response.json();
+            })
+            .then(function (data) {
+                load(data);
+                state = "ready";
+                var callbacks = waiting;
+                waiting = [];
+                callbacks.forEach(function (cb) { cb(); });
+            })
+            .catch(function (error) {
+                if (state !== "loading") throw error;
+                state = "remote";
+                waiting = [];
+                console.error("Could not load " + src, error);
+            });
+    };
+}
+"""
+
+
+class GeoJsonStore(MacroElement):
+    """Region geometries emitted once and shared by every layer that draws them.
+
+    Each region carries its own levels of detail; layers reference a region by
+    id through :class:`RegionLayer`, so a shape drawn in several layers (with
+    different styles) appears only once in the page. Must be added to the map
+    before the layers that reference it.
+
+    With a packed ``encoding`` (see :mod:`encoding`) the geometries travel as
+    delta-encoded strings and are decoded the first time a level is drawn.
+    The geometries of the ``lazy`` regions are not embedded but saved to
+    ``src`` (see ``external``) and fetched when a layer first draws one of
+    them.
+
+    Args:
+        regions: Region id to ``(min_zoom, geojson)`` pairs, coarsest first.
+        encoding: ``"json"``, ``"polyline"`` or ``"int32"``.
+        precision: Decimal places of the coordinates (grid of packed payloads).
+        src: Path of the payload file, relative to the page.
+        lazy: Ids of the regions saved to ``src``.
+
+    Raises:
+        ValueError: If ``lazy`` regions are given without ``src``.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function (regions, src, lazy, encoding, scale) {
+                {{ this.deferred_js }}
+                {%- if this.encoding != "json" %}
+                {{ this.unpack_js }}
+                {%- endif %}
+                var decoded = {};
+                function decode(g) {
+                    var rings = unpack(g.packed, encoding).map(function (r) {
+                        var x = 0, y = 0;
+                        return r.map(function (p) {
+                            x += p[0];
+                            y += p[1];
+                            return [x / scale, y / scale];
+                        });
+                    });
+                    var polys = [], k = 0;
+                    g.parts.forEach(function (n) {
+                        polys.push(rings.slice(k, k + n));
+                        k += n;
+                    });
+                    return {type: g.type, coordinates: g.type === "Polygon" ? polys[0] : polys};
+                }
+                return {
+                    ready: deferred(src, lazy, function (data) {
+                        for (var id in data) regions[id] = data[id];
+                    }),
+                    level: function (id, zoom) {
+                        var levels = regions[id], i = 0;
+                        while (i + 1 < levels.length && zoom >= levels[i + 1][0]) i++;
+                        return i;
+                    },
+                    shape: function (id, i) {
+                        var g = regions[id][i][1], key = id + "/" + i;
+                        if (encoding === "json") return g;
+                        return decoded[key] || (decoded[key] = decode(g));
+                    }
+                };
+            })(
+                {{ this.payload_js }},
+                {{ this.src|tojson }},
+                {{ this.lazy|tojson }},
+                {{ this.encoding|tojson }},
+                {{ 10 ** this.precision }}
+            );
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        regions: Dict[str, Sequence[Tuple[int, Dict[str, Any]]]],
+        encoding: str = "json",
+        precision: int = 5,
+        src: str | None = None,
+        lazy: Sequence[str] = (),
+    ) -> None:
+        super().__init__()
+        if lazy and src is None:
+            raise ValueError("Lazy regions need a src to be saved to")
+        self._name = "GeoJsonStore"
+        self.encoding = encoding
+        self.precision = precision
+        self.src = src
+        self.lazy = [rid for rid in regions if rid in lazy]
+        self.unpack_js = UNPACK_JS
+        self.deferred_js = DEFERRED_JS
+        if encoding == "json":
+            payload = {rid: [(z, geometry_of(s)) for z, s in levels] for rid, levels in regions.items()}
+        else:
+            payload = {
+                rid: [(z, pack_geometry(s, precision, encoding)) for z, s in levels]
+                for rid, levels in regions.items()
+            }
+        self.payload_js = to_js({rid: v for rid, v in payload.items() if rid not in self.lazy})
+        self.external = {src: {rid: payload[rid] for rid in self.lazy}} if self.lazy else {}
+
+
+class TopologyStore(MacroElement):
+    """One TopoJSON topology shared by every region layer on the map.
+
+    The topology's objects and transform are emitted once, together with the
+    delta-encoded arcs of each level of detail. A small inline decoder turns a
+    region into a GeoJSON geometry on demand (arcs are decoded once per level),
+    so no TopoJSON client library is needed. Like :class:`GeoJsonStore`, it
+    must be added to the map before the :class:`RegionLayer` objects using it
+    and it can pack the arcs of each level with a compact ``encoding``.
+
+    The topology itself is always embedded. The arcs drawn only by the
+    ``lazy`` regions are saved to ``src`` and fetched when a layer first draws
+    one of them; arcs shared with an embedded region (a common border) stay
+    in the page, so the lazy file holds each arc at most once as well.
+
+    Args:
+        topology: TopoJSON topology as built by :func:`topology.build_topology`.
+        levels: ``(min_zoom, ids, arcs)`` triples, coarsest first: the arcs
+            stored by each level (see :func:`topology.build_topology`).
+        encoding: ``"json"``, ``"polyline"`` or ``"int32"``.
+        src: Path of the payload file, relative to the page.
+        lazy: Ids of the regions whose own arcs are saved to ``src``.
+
+    Raises:
+        ValueError: If ``lazy`` regions are given without ``src``.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function (data, src, lazy, encoding) {
+                {{ this.deferred_js }}
+                {%- if this.encoding != "json" %}
+                {{ this.unpack_js }}
+                {%- endif %}
+                var topology = data.topology, levels = data.levels, objects = {}, decoded = [];
+                topology.objects.regions.geometries.forEach(function (g) { objects[g.id] = g; });
+                // The [ids, arcs] stored by each level: the page's, then those
+                // fetched from src.
+                var parts = [levels.map(function (level) { return level.slice(1); })];
+                // The arcs a level lacks are those of the next finer level.
+                function arcsAt(i) {
+                    if (!decoded[i]) {
+                        var t = topology.transform;
+                        var arcs = i + 1 < levels.length ? arcsAt(i + 1).slice() : [];
+                        parts.forEach(function (part) {
+                            var ids = part[i][0], stored = part[i][1];
+                            if (encoding !== "json") stored = unpack(stored, encoding);
+                            stored.forEach(function (arc, k) {
+                                var x = 0, y = 0;
+                                arcs[ids[k]] = arc.map(function (p) {
+                                    x += p[0];
+                                    y += p[1];
+                                    return [x * t.scale[0] + t.translate[0], y * t.scale[1] + t.translate[1]];
+                                });
+                            });
+                        });
+                        decoded[i] = arcs;
+                    }
+                    return decoded[i];
+                }
+                function ring(arcs, ids) {
+                    var out = [];
+                    ids.forEach(function (id) {
+                        var arc = id < 0 ? arcs[~id].slice().reverse() : arcs[id];
+                        for (var k = out.length ? 1 : 0; k < arc.length; k++) out.push(arc[k]);
+                    });
+                    return out;
+                }
+                return {
+                    ready: deferred(src, lazy, function (data) {
+                        parts.push(data.levels);
+                        decoded = [];
+                    }),
+                    level: function (id, zoom) {
+                        var i = 0;
+                        while (i + 1 < levels.length && zoom >= levels[i + 1][0]) i++;
+                        return i;
+                    },
+                    shape: function (id, i) {
+                        var g = objects[id], arcs = arcsAt(i);
+                        function polygon(p) { return p.map(function (r) { return ring(arcs, r); }); }
+                        return {
+                            type: g.type,
+                            coordinates: g.type === "Polygon" ? polygon(g.arcs) : g.arcs.map(polygon)
+                        };
+                    }
+                };
+            })({{ this.payload_js }}, {{ this.src|tojson }}, {{ this.lazy|tojson }}, {{ this.encoding|tojson }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        topology: Dict[str, Any],
+        levels: Sequence[Tuple[int, Any]],
+        encoding: str = "json",
+        src: str | None = None,
+        lazy: Sequence[str] = (),
+    ) -> None:
+        super().__init__()
+        if lazy and src is None:
+            raise ValueError("Lazy regions need a src to be saved to")
+        self._name = "TopologyStore"
+        self.encoding = encoding
+        self.src = src
+        self.unpack_js = UNPACK_JS
+        self.deferred_js = DEFERRED_JS
+        geometries = topology["objects"]["regions"]["geometries"]
+        self.lazy = [g["id"] for g in geometries if g["id"] in lazy]
+        embedded = set().union(*(_arc_ids(g["arcs"]) for g in geometries if g["id"] not in self.lazy))
+
+        def stored(ids: List[int], arcs: List[Any], inline: bool) -> Tuple[List[int], Any]:
+            keep = [k for k, i in enumerate(ids) if (i in embedded) == inline]
+            kept = [arcs[k] for k in keep]
+            return [ids[k] for k in keep], kept if encoding == "json" else pack(kept, encoding)
+
+        # The arcs travel in ``levels``; do not embed the finest level twice.
+        payload = {
+            "topology": {k: v for k, v in topology.items() if k != "arcs"},
+            "levels": [(z, *stored(ids, arcs, True)) for z, ids, arcs in levels],
+        }
+        self.payload_js = to_js(payload)
+        self.external = {}
+        if self.lazy:
+            self.external = {src: {"levels": [stored(ids, arcs, False) for _, ids, arcs in levels]}}
+
+
+class RegionLayer(MacroElement):
+    """A styled region drawn by reference from a shared geometry store.
+
+    The store's levels of detail are swapped on ``zoomend``; each level's
+    Leaflet layer is built the first time it is shown, so nothing is decoded
+    or built for a hidden layer until it is first enabled.
+
+    Args:
+        store: The :class:`GeoJsonStore` or :class:`TopologyStore` holding the
+            region geometry.
+        region: Id of the region inside the store.
+        style: Leaflet path options.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function (map, group, store, id, style) {
+                var layers = [], current = null;
+                function draw() {
+                    var i = store.level(id, map.getZoom());
+                    if (!layers[i]) {
+                        layers[i] = L.geoJson(store.shape(id, i), {style: function () { return style; }});
+                    }
+                    if (layers[i] === current) return;
+                    if (current) group.removeLayer(current);
+                    group.addLayer(layers[i]);
+                    current = layers[i];
+                }
+                function update() {
+                    if (map.hasLayer(group)) store.ready(id, draw);
+                }
+                map.on("zoomend", update);
+                group.on("add", update);
+                update();
+                return layers;
+            })(
+                {{ this.parent_map }},
+                {{ this._parent.get_name() }},
+                {{ this.store.get_name() }},
+                {{ this.region|tojson }},
+                {{ this.style|tojson }}
+            );
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, store: MacroElement, region: str, style: Dict[str, Any]) -> None:
+        super().__init__()
+        self._name = "RegionLayer"
+        self.store = store
+        self.region = region
+        self.style = style
+        self.parent_map = None
+
+    def render(self, **kwargs: Any) -> None:
+        self.parent_map = get_obj_in_upper_tree(self, Map).get_name()
+        super().render(**kwargs)
+
+
+# Leaflet options of a peak name bound to its pin as a permanent tooltip; the
+# offset puts it where the ``DivIcon`` label used to be, under the pin's tip.
+LABEL_TOOLTIP: Dict[str, Any] = {
+    "permanent": True,
+    "direction": "bottom",
+    "offset": [0, 13],
+    "className": "peak-label",
+    "interactive": False,
+}
+
+
+# Peak popup, shared by every peak: ``{name}`` and ``{url}`` are the escaped
+# record fields and ``{climbed}`` is ``CLIMBED_TEMPLATE`` for climbed peaks.
+POPUP_TEMPLATE = (
+    '<div style="text-align:center; font-weight:bold">'
+    '<a href="{url}" target="_blank" rel="noopener noreferrer" style="color:black">{name}</a>'
+    "{climbed}</div>"
+)
+CLIMBED_TEMPLATE = '<div style="font-weight:normal">Climbed {date}</div>'
+
+
+class LabelStyle(MacroElement):
+    """Stylesheet turning ``peak-label`` tooltips into bare text labels.
+
+    Strips the tooltip box, shadow and arrow so a permanent tooltip looks like
+    the former ``DivIcon`` label. Add it once to the map.
+    """
+
+    _template = Template(
+        """
+        {% macro header(this, kwargs) %}
+            <style>
+                .leaflet-tooltip.peak-label {
+                    background: none;
+                    border: none;
+                    box-shadow: none;
+                    padding: 0;
+                    font-size: 12px;
+                    font-weight: bold;
+                    color: black;
+                }
+                .leaflet-tooltip.peak-label:before {
+                    display: none;
+                }
+            </style>
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._name = "LabelStyle"
+
+
+# Marker colours of awesome-markers, reused by the sprite pins so that both
+# styles look alike; other colours are used as given.
+PIN_COLORS = {
+    "red": "#d63e2a",
+    "darkred": "#a23336",
+    "lightred": "#ff8e7f",
+    "orange": "#f69730",
+    "beige": "#ffcb92",
+    "green": "#72b026",
+    "darkgreen": "#728224",
+    "lightgreen": "#bbf970",
+    "blue": "#38aadd",
+    "darkblue": "#0067a3",
+    "lightblue": "#8adaff",
+    "cadetblue": "#436978",
+    "purple": "#d252b9",
+    "darkpurple": "#5b396b",
+    "pink": "#ff91ea",
+    "white": "#fbfbfb",
+    "gray": "#575757",
+    "lightgray": "#a3a3a3",
+    "black": "#303030",
+}
+# Leaflet icon options of a sprite pin, matching the awesome-markers geometry.
+PIN_ICON = {"className": "peak-pin", "iconSize": [35, 45], "iconAnchor": [17, 42], "popupAnchor": [1, -32]}
+
+
+def pin_html(color: str, challenge: bool = False) -> str:
+    """Markup of a sprite pin: a reference to its :class:`PinSprite` symbol."""
+    symbol = f"pin-{color}-challenge" if challenge else f"pin-{color}"
+    return f'<svg width="35" height="45"><use href="#{symbol}"/></svg>'
+
+
+class PinSprite(MacroElement):
+    """Inline SVG sprite of the peak pins, one symbol per colour and variant.
+
+    awesome-markers loads a sprite sheet and an icon font to draw a coloured
+    flag, and the flags pop in (shifting the pins) when the font arrives.
+    Here every pin is a fixed-size ``divIcon`` whose markup (:func:`pin_html`)
+    references a symbol defined once in the page body; challenge variants
+    carry a star instead of the flag. Add it once to the map.
+
+    Args:
+        pins: ``(color, challenge)`` pairs to define symbols for.
+    """
+
+    _template = Template(
+        """
+        {% macro header(this, kwargs) %}
+            <style>
+                .peak-pin {
+                    background: none;
+                    border: none;
+                }
+                .peak-pin svg {
+                    display: block;
+                    filter: drop-shadow(1px 2px 1px rgba(0, 0, 0, 0.35));
+                }
+            </style>
+        {% endmacro %}
+        {% macro html(this, kwargs) %}
+            <svg xmlns="http://www.w3.org/2000/svg" aria-hidden="true" style="position: absolute; width: 0; height: 0">
+                {%- for symbol, fill, glyph in this.symbols %}
+                <symbol id="{{ symbol }}" viewBox="0 0 35 45">
+                    <path d="M17.5 43C13 35 3.5 26 3.5 16.5a14 14 0 0 1 28 0C31.5 26 22 35 17.5 43z" fill="{{ fill }}"/>
+                    <path d="{{ glyph }}" fill="#fff"/>
+                </symbol>
+                {%- endfor %}
+            </svg>
+        {% endmacro %}
+        """
+    )
+
+    FLAG = "M12 9h1.8v15H12zM13.8 9.5h9.7l-2.6 3.7 2.6 3.7h-9.7z"
+    STAR = "M17.5 8.5L19.3 13.5L24.6 13.7L20.4 17L21.9 22.1L17.5 19.1L13.1 22.1L14.6 17L10.4 13.7L15.7 13.5z"
+
+    def __init__(self, pins: Sequence[Tuple[str, bool]]) -> None:
+        super().__init__()
+        self._name = "PinSprite"
+        self.symbols = [
+            (
+                f"pin-{color}-challenge" if challenge else f"pin-{color}",
+                PIN_COLORS.get(color, color),
+                self.STAR if challenge else self.FLAG,
+            )
+            for color, challenge in dict.fromkeys(pins)
+        ]
+
+
+class PeakStore(MacroElement):
+    """All the peaks on the map, emitted once as one data array.
+
+    Folium's ``Marker``/``Icon``/``Popup``/``DivIcon`` classes each render their
+    own script block, so a peak with a label costs several hundred bytes of
+    boilerplate. Here the page carries one compact array of records and the
+    browser builds the same pin, popup and label for each peak the first time
+    it is shown; one icon is shared per pin style.
+
+    Layers do not own markers: a :class:`PeakView` in each layer shows and
+    hides peaks of the store by index, and a marker stays on the map while at
+    least one visible layer includes it. Must be added to the map before the
+    layers that reference it. Clustered layers (:class:`PeakCluster`) get
+    their own pins from the store, always labelled with a tooltip, and canvas
+    layers (:class:`PeakCanvas`) their records, popups and a shared Canvas
+    renderer.
+
+    With ``shard_zoom`` the records are not embedded: they are split into the
+    quadtree tiles of that zoom (saved as ``external`` files), which the page
+    fetches once each when they come into view from ``shard_min_zoom`` on.
+    Layers are then the bits of each peak's layer mask, so the page holds no
+    per-peak data at all; clustered and canvas layers need embedded records.
+
+    Labels are only drawn from each peak's label zoom on (see
+    :func:`labels.place_labels`) and follow ``zoomend``. Popups are rendered
+    from the record, with :data:`POPUP_TEMPLATE`, when they open; records hold
+    raw text, escaped in the browser.
+
+    Args:
+        peaks: ``(lat, lon, name, url, (color, challenge), label_zoom,
+            climbed_date)`` records; ``url`` and ``climbed_date`` may be empty.
+        label: ``"marker"`` draws each name as a second marker with a
+            ``DivIcon``; ``"tooltip"`` binds it to the pin as a permanent
+            tooltip (see :class:`LabelStyle`), one layer per peak instead of two.
+        masks: Per peak, the bit mask of the layers including it (sharded
+            stores only).
+        shard_zoom: Zoom of the quadtree tiles; ``None`` embeds the records.
+        shard_min_zoom: Zoom from which shards are loaded and shown.
+        shard_dir: Directory of the shard files, relative to the page.
+        omit: Peaks left out of the embedded records, to be supplied by a
+            :class:`PeakView` payload.
+        sprite: Draw pins from a :class:`PinSprite` (which must be on the
+            page) instead of awesome-markers, with the challenge variants.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function (map, pins, peaks, templates) {
+                var layer = L.layerGroup().addTo(map), markers = [], labels = [], counts = [];
+                var icons = pins.map(function (pin) {
+                    {%- if this.sprite %}
+                    return L.divIcon(Object.assign({html: pin[1]}, {{ this.pin_icon_js }}));
+                    {%- else %}
+                    return L.AwesomeMarkers.icon({
+                        markerColor: pin[0],
+                        iconColor: "white",
+                        icon: "flag",
+                        prefix: "glyphicon",
+                        extraClasses: "fa-rotate-0"
+                    });
+                    {%- endif %}
+                });
+                var canvas = null;
+                function esc(s) {
+                    return String(s).replace(/[&<>"']/g, function (c) { return "&#" + c.charCodeAt(0) + ";"; });
+                }
+                function fill(template, values) {
+                    return template.replace(/\\{(\\w+)\\}/g, function (_, key) { return values[key]; });
+                }
+                // Popup content is rendered from the record when the popup opens.
+                function popup(p) {
+                    return function () {
+                        return fill(templates.popup, {
+                            name: esc(p[2]),
+                            url: esc(p[3] || "#"),
+                            climbed: p[6] ? fill(templates.climbed, {date: esc(p[6])}) : ""
+                        });
+                    };
+                }
+                function pin(p) {
+                    return L.marker([p[0], p[1]], {icon: icons[p[4]]}).bindPopup(popup(p), {maxWidth: 250});
+                }
+                function labelled(p) {
+                    return pin(p).bindTooltip(esc(p[2]), {{ this.tooltip_options|tojson }});
+                }
+                function marker(i) {
+                    {%- if this.label == "tooltip" %}
+                    return pin(peaks[i]);
+                    {%- else %}
+                    return L.layerGroup([pin(peaks[i])]);
+                    {%- endif %}
+                }
+                // Shows or hides the label of a displayed peak, from its label zoom on.
+                function refresh(i) {
+                    var p = peaks[i], on = map.getZoom() >= p[5];
+                    if (on === !!labels[i]) return;
+                    {%- if this.label == "tooltip" %}
+                    labels[i] = on;
+                    if (on) markers[i].bindTooltip(esc(p[2]), {{ this.tooltip_options|tojson }});
+                    else markers[i].unbindTooltip();
+                    {%- else %}
+                    if (on) {
+                        labels[i] = L.marker([p[0], p[1]], {
+                            icon: L.divIcon({
+                                className: "empty",
+                                html: '<div style="pointer-events:none; text-align:center; '
+                                    + "transform: translate(-50%, 25px); "
+                                    + 'font-size:12px; font-weight:bold; color:black;">' + esc(p[2]) + "</div>"
+                            })
+                        });
+                        markers[i].addLayer(labels[i]);
+                    } else {
+                        markers[i].removeLayer(labels[i]);
+                        labels[i] = null;
+                    }
+                    {%- endif %}
+                }
+                map.on("zoomend", function () {
+                    markers.forEach(function (m, i) { if (layer.hasLayer(m)) refresh(i); });
+                });
+                function add(i) {
+                    layer.addLayer(markers[i] || (markers[i] = marker(i)));
+                    refresh(i);
+                }
+                {%- if this.shards is not none %}
+                // Peaks arrive in quadtree tiles fetched when they come into view;
+                // layers are bits of each record's layer mask (p[7]).
+                var tiles = {{ this.tiles_js }}, z = {{ this.shard_zoom }}, minZoom = {{ this.shard_min_zoom }};
+                var loaded = {}, inView = {}, visible = 0;
+                function tile(lat, lon) {
+                    var n = Math.pow(2, z), s = Math.sin(Math.max(-85, Math.min(85, lat)) * Math.PI / 180);
+                    return [
+                        Math.floor((lon + 180) / 360 * n),
+                        Math.floor((0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI)) * n)
+                    ];
+                }
+                function sync(key) {
+                    loaded[key].forEach(function (i) {
+                        var on = inView[key] && (peaks[i][7] & visible);
+                        if (on && !(markers[i] && layer.hasLayer(markers[i]))) add(i);
+                        else if (!on && markers[i]) layer.removeLayer(markers[i]);
+                    });
+                }
+                function load(key) {
+                    loaded[key] = [];
+                    var src = {{ this.shard_dir|tojson }} + "/" + key + ".json";
+                    fetch(src)
+                        .then(function (response) {
+                            if (!response.ok) throw new Error("HTTP " + response.status);
+                            return response.json();
+                        })
+                        .then(function (shard) {
+                            shard.ids.forEach(function (i, k) { peaks[i] = shard.peaks[k]; });
+                            loaded[key] = shard.ids;
+                            sync(key);
+                        })
+                        .catch(function (error) {
+                            // Retried when the tile next comes into view.
+                            delete loaded[key];
+                            console.error("Could not load " + src, error);
+                        });
+                }
+                function update() {
+                    var b = map.getBounds().pad(0.25);
+                    var nw = tile(b.getNorth(), b.getWest()), se = tile(b.getSouth(), b.getEast());
+                    var show = map.getZoom() >= minZoom;
+                    tiles.forEach(function (key) {
+                        var t = key.split("-").map(Number);
+                        inView[key] = show && t[1] >= nw[0] && t[1] <= se[0] && t[2] >= nw[1] && t[2] <= se[1];
+                        if (inView[key] && !loaded[key]) load(key);
+                        else if (loaded[key]) sync(key);
+                    });
+                }
+                map.on("moveend", update);
+                return {
+                    show: function (bit) {
+                        visible |= 1 << bit;
+                        update();
+                    },
+                    hide: function (bit) {
+                        visible &= ~(1 << bit);
+                        update();
+                    },
+                {%- else %}
+                return {
+                    show: function (ids) {
+                        ids.forEach(function (i) {
+                            if (!counts[i]) add(i);
+                            counts[i] = (counts[i] || 0) + 1;
+                        });
+                    },
+                    hide: function (ids) {
+                        ids.forEach(function (i) {
+                            if (!--counts[i]) layer.removeLayer(markers[i]);
+                        });
+                    },
+                {%- endif %}
+                    pins: function (ids) {
+                        return ids.map(function (i) { return labelled(peaks[i]); });
+                    },
+                    put: function (ids, records) {
+                        ids.forEach(function (i, k) { peaks[i] = records[k]; });
+                    },
+                    peak: function (i) { return peaks[i]; },
+                    color: function (p) { return pins[p[4]][0]; },
+                    popup: popup,
+                    label: function (p) { return esc(p[2]); },
+                    canvas: function () { return canvas || (canvas = L.canvas()); }
+                };
+            })({{ this.parent_map }}, {{ this.pins_js }}, {{ this.peaks_js }}, {{ this.templates_js }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        peaks: Sequence[Tuple[float, float, str, str, Tuple[str, bool], int, str]],
+        label: str = "marker",
+        masks: Sequence[int] | None = None,
+        shard_zoom: int | None = None,
+        shard_min_zoom: int = 0,
+        shard_dir: str = "peaks",
+        omit: Sequence[int] = (),
+        sprite: bool = False,
+    ) -> None:
+        super().__init__()
+        self._name = "PeakStore"
+        self.label = label
+        self.tooltip_options = LABEL_TOOLTIP
+        self.parent_map = None
+        self.sprite = sprite
+        self.pin_icon_js = to_js(PIN_ICON)
+        pins: List[Tuple[str, bool]] = []
+        self.rows: List[list] = []
+        for lat, lon, name, url, (color, challenge), label_zoom, climbed_date in peaks:
+            pin = (color, challenge and sprite)
+            if pin not in pins:
+                pins.append(pin)
+            self.rows.append([lat, lon, name, url, pins.index(pin), label_zoom, climbed_date])
+        self.pins_js = to_js([[color, pin_html(color, challenge) if sprite else None] for color, challenge in pins])
+        self.templates_js = to_js({"popup": POPUP_TEMPLATE, "climbed": CLIMBED_TEMPLATE})
+        self.omitted = set(omit)
+        self.external: Dict[str, Any] = {}
+        self.shards: Dict[str, Dict[str, list]] | None = None
+        self.shard_zoom = shard_zoom
+        self.shard_min_zoom = shard_min_zoom
+        self.shard_dir = shard_dir
+        if shard_zoom is None:
+            self.peaks_js = to_js([None if i in self.omitted else r for i, r in enumerate(self.rows)])
+            return
+        self.shards = {}
+        xs, ys = project(np.array([r[0] for r in self.rows]), np.array([r[1] for r in self.rows]))
+        n = 2**shard_zoom
+        for i, (row, x, y, mask) in enumerate(zip(self.rows, xs, ys, masks or [0] * len(self.rows))):
+            shard = self.shards.setdefault(f"{shard_zoom}-{int(x * n)}-{int(y * n)}", {"ids": [], "peaks": []})
+            shard["ids"].append(i)
+            shard["peaks"].append(row + [mask])
+        self.external = {f"{shard_dir}/{key}.json": shard for key, shard in self.shards.items()}
+        self.peaks_js = "[]"
+        self.tiles_js = to_js(sorted(self.shards))
+
+    def records(self, ids: Sequence[int]) -> List[list]:
+        """Return the page records of the peaks ``ids``, e.g. for an external payload."""
+        return [self.rows[i] for i in ids]
+
+    def render(self, **kwargs: Any) -> None:
+        self.parent_map = get_obj_in_upper_tree(self, Map).get_name()
+        super().render(**kwargs)
+
+
+class PeakView(MacroElement):
+    """The peaks of a layer, shown from a shared :class:`PeakStore`.
+
+    Added to a ``FeatureGroup``: when the group is toggled on or off (e.g. from
+    the layer control) its peaks are shown or hidden in the store, so a peak in
+    several layers is a single marker.
+
+    With ``src``, the records of the layer's peaks that the store omitted are
+    saved to that file (see ``external``) and fetched the first time the group
+    is enabled.
+
+    Args:
+        store: The map's :class:`PeakStore`.
+        ids: Indices of the layer's peaks in the store or, for a sharded
+            store, the layer's bit in the peaks' layer masks.
+        src: Path of the payload file, relative to the page.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            (function (map, group, store, ids, src) {
+                var state = src ? "remote" : "ready", shown = false;
+                function show() {
+                    if (shown || !map.hasLayer(group)) return;
+                    {%- if this.src is not none %}
+                    if (state === "remote") {
+                        state = "loading";
+                        fetch(src)
+                            .then(function (response) {
+                                if (!response.ok) throw new Error("HTTP " + response.status);
+                                return response.json();
+                            })
+                            .then(function (data) {
+                                store.put(data.ids, data.peaks);
+                                state = "ready";
+                                show();
+                            })
+                            .catch(function (error) {
+                                // Retried the next time the group is enabled.
+                                if (state !== "loading") throw error;
+                                state = "remote";
+                                console.error("Could not load " + src, error);
+                            });
+                    }
+                    {%- endif %}
+                    if (state !== "ready") return;
+                    shown = true;
+                    store.show(ids);
+                }
+                function hide() {
+                    if (!shown) return;
+                    shown = false;
+                    store.hide(ids);
+                }
+                group.on("add", show);
+                group.on("remove", hide);
+                show();
+            })(
+                {{ this.parent_map }},
+                {{ this._parent.get_name() }},
+                {{ this.store.get_name() }},
+                {{ this.ids|tojson }},
+                {{ this.src|tojson }}
+            );
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, store: PeakStore, ids: Sequence[int] | int, src: str | None = None) -> None:
+        super().__init__()
+        self._name = "PeakView"
+        self.store = store
+        self.ids = ids if isinstance(ids, int) else list(ids)
+        self.src = src
+        self.external: Dict[str, Any] = {}
+        if src is not None and not isinstance(ids, int):
+            lazy = [i for i in ids if i in store.omitted]
+            self.external = {src: {"ids": lazy, "peaks": store.records(lazy)}}
+        self.parent_map = None
+
+    def render(self, **kwargs: Any) -> None:
+        self.parent_map = get_obj_in_upper_tree(self, Map).get_name()
+        super().render(**kwargs)
+
+
+def cluster_options(radius: int, disable_at_zoom: int) -> Dict[str, Any]:
+    """Leaflet.markercluster options for a cluster radius and cut-off zoom."""
+    return {"maxClusterRadius": radius, "disableClusteringAtZoom": disable_at_zoom, "chunkedLoading": True}
+
+
+class PeakCluster(JSCSSMixin, MacroElement):
+    """The peaks of a layer, clustered in the browser with Leaflet.markercluster.
+
+    Added to a ``FeatureGroup`` instead of a :class:`PeakView`. A cluster group
+    cannot share markers with other layers, so the layer builds its own pins
+    from the :class:`PeakStore` (labelled with tooltips, which cluster with
+    their pin), the first time the group is shown. Markers are added in one
+    ``addLayers`` call with ``chunkedLoading``, so large layers are clustered
+    in slices without blocking the page.
+
+    Args:
+        store: The map's :class:`PeakStore`.
+        ids: Indices of the layer's peaks in the store.
+        radius: Maximum cluster radius in pixels.
+        disable_at_zoom: Zoom level from which peaks are no longer clustered.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function (map, group, store, ids, options) {
+                var cluster = L.markerClusterGroup(options);
+                function build() {
+                    group.addLayer(cluster);
+                    cluster.addLayers(store.pins(ids));
+                }
+                if (map.hasLayer(group)) build();
+                else group.once("add", build);
+                return cluster;
+            })(
+                {{ this.parent_map }},
+                {{ this._parent.get_name() }},
+                {{ this.store.get_name() }},
+                {{ this.ids|tojson }},
+                {{ this.options|tojson }}
+            );
+        {% endmacro %}
+        """
+    )
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    def __init__(self, store: PeakStore, ids: Sequence[int], radius: int = 80, disable_at_zoom: int = 12) -> None:
+        super().__init__()
+        self._name = "PeakCluster"
+        self.store = store
+        self.ids = list(ids)
+        self.options = cluster_options(radius, disable_at_zoom)
+        self.parent_map = None
+
+    def render(self, **kwargs: Any) -> None:
+        self.parent_map = get_obj_in_upper_tree(self, Map).get_name()
+        super().render(**kwargs)
+
+
+class PeakClusterIndex(JSCSSMixin, MacroElement):
+    """The peaks of a layer, clustered at build time.
+
+    Takes the levels computed by :func:`clustering.build_cluster_levels` and,
+    on every ``moveend``, draws only the nodes of the current zoom level that
+    lie in (a padded) viewport, reusing the markers already on the map. Cluster
+    nodes use Leaflet.markercluster's look (its stylesheet, no script) and zoom
+    in to where they split when clicked; single peaks are labelled pins from
+    the :class:`PeakStore`.
+
+    Args:
+        store: The map's :class:`PeakStore`.
+        levels: ``(min_zoom, nodes)`` pairs, coarsest first.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function (map, group, store, levels) {
+                var shown = L.layerGroup().addTo(group), current = {}, cache = {};
+                function cluster(n) {
+                    var size = n[2] < 10 ? "small" : n[2] < 100 ? "medium" : "large";
+                    return L.marker([n[0], n[1]], {
+                        icon: L.divIcon({
+                            html: "<div><span>" + n[2] + "</span></div>",
+                            className: "marker-cluster marker-cluster-" + size,
+                            iconSize: L.point(40, 40)
+                        })
+                    }).on("click", function () { map.setView([n[0], n[1]], n[3]); });
+                }
+                function update() {
+                    if (!map.hasLayer(group)) return;
+                    var zoom = map.getZoom(), i = 0, next = {}, key;
+                    while (i + 1 < levels.length && zoom >= levels[i + 1][0]) i++;
+                    var bounds = map.getBounds().pad(0.25);
+                    levels[i][1].forEach(function (n, k) {
+                        if (!bounds.contains([n[0], n[1]])) return;
+                        key = n[2] === 1 ? "p" + n[3] : i + "/" + k;
+                        next[key] = cache[key] || (cache[key] = n[2] === 1 ? store.pins([n[3]])[0] : cluster(n));
+                    });
+                    for (key in current) if (!next[key]) shown.removeLayer(current[key]);
+                    for (key in next) if (!current[key]) shown.addLayer(next[key]);
+                    current = next;
+                }
+                map.on("moveend", update);
+                group.on("add", update);
+                update();
+                return shown;
+            })(
+                {{ this.parent_map }},
+                {{ this._parent.get_name() }},
+                {{ this.store.get_name() }},
+                {{ this.levels_js }}
+            );
+        {% endmacro %}
+        """
+    )
+
+    default_css = MarkerCluster.default_css
+
+    def __init__(self, store: PeakStore, levels: Sequence[Tuple[int, Any]]) -> None:
+        super().__init__()
+        self._name = "PeakClusterIndex"
+        self.store = store
+        self.levels_js = to_js(list(levels))
+        self.parent_map = None
+
+    def render(self, **kwargs: Any) -> None:
+        self.parent_map = get_obj_in_upper_tree(self, Map).get_name()
+        super().render(**kwargs)
+
+
+class PeakCanvas(MacroElement):
+    """The peaks of a layer as circle markers drawn on one Canvas renderer.
+
+    DOM markers (an icon, its shadow and a label per peak) stop scaling at a
+    few thousand peaks; circle markers on a Canvas renderer are painted into a
+    single element. Colours are the store's pin colours. Names are only shown,
+    as permanent tooltips on the peaks in the viewport, from ``label_zoom`` (or
+    the peak's own, higher, label zoom) on.
+    Markers are built the first time the layer is shown.
+
+    Args:
+        store: The map's :class:`PeakStore`.
+        ids: Indices of the layer's peaks in the store.
+        label_zoom: Zoom level from which peak names are drawn.
+        radius: Circle radius in pixels.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function (map, group, store, ids, labelZoom, radius, tooltip) {
+                var markers = null;
+                function build() {
+                    markers = ids.map(function (i) {
+                        var p = store.peak(i);
+                        return L.circleMarker([p[0], p[1]], {
+                            renderer: store.canvas(),
+                            radius: radius,
+                            color: "white",
+                            weight: 1,
+                            fillColor: store.color(p),
+                            fillOpacity: 0.9
+                        }).bindPopup(store.popup(p), {maxWidth: 250}).addTo(group);
+                    });
+                }
+                function labels() {
+                    if (!map.hasLayer(group)) return;
+                    if (!markers) build();
+                    var zoom = map.getZoom(), bounds = map.getBounds();
+                    markers.forEach(function (m, k) {
+                        var p = store.peak(ids[k]);
+                        var on = zoom >= Math.max(labelZoom, p[5]) && bounds.contains(m.getLatLng());
+                        if (on && !m.getTooltip()) m.bindTooltip(store.label(p), tooltip);
+                        else if (!on && m.getTooltip()) m.unbindTooltip();
+                    });
+                }
+                map.on("moveend", labels);
+                group.on("add", labels);
+                labels();
+                return group;
+            })(
+                {{ this.parent_map }},
+                {{ this._parent.get_name() }},
+                {{ this.store.get_name() }},
+                {{ this.ids|tojson }},
+                {{ this.label_zoom }},
+                {{ this.radius }},
+                {{ this.tooltip_options|tojson }}
+            );
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, store: PeakStore, ids: Sequence[int], label_zoom: int = 12, radius: int = 6) -> None:
+        super().__init__()
+        self._name = "PeakCanvas"
+        self.store = store
+        self.ids = list(ids)
+        self.label_zoom = label_zoom
+        self.radius = radius
+        # Below the circle rather than below a pin's tip.
+        self.tooltip_options = {**LABEL_TOOLTIP, "offset": [0, radius]}
+        self.parent_map = None
+
+    def render(self, **kwargs: Any) -> None:
+        self.parent_map = get_obj_in_upper_tree(self, Map).get_name()
+        super().render(**kwargs)
@@ -0,0 +1,107 @@
+"""
+Compact encodings for the coordinate payloads embedded in the page.
+
+Verbose JSON arrays (``[[-2.12345,43.12345],...]``) dominate the size of the
+generated HTML and the browser's parse time. Coordinates are instead packed as
+integer deltas on the ``10 ** -precision`` grid and serialized as either
+
+- ``"polyline"``: Google's encoded-polyline character scheme (zig-zag varints,
+  five bits per printable character), the smallest option; or
+- ``"int32"``: base64 of little-endian ``Int32`` values, slightly larger but
+  decoded with a typed-array view.
+
+A packed payload is ``{"n": [points per sequence], "d": <string>}``; the
+matching JavaScript decoder lives in :mod:`elements`. ``"json"`` leaves
+payloads as plain arrays.
+
+Both packed encodings hold 32-bit signed integers (the JavaScript polyline
+decoder works on 32-bit bitwise operators), which bounds the precision: a
+longitude delta spans up to 360 degrees, so at most 6 decimals are safe.
+"""
+from __future__ import annotations
+
+import base64
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from geometry import geometry_of
+
+ENCODINGS = ("json", "polyline", "int32")
+INT32_MAX = 2**31 - 1
+# Largest coordinate delta to encode, in degrees (longitudes span 360).
+MAX_DEGREES = 360
+
+
+def check_encoding(encoding: str, precision: int) -> None:
+    """Validate a geometry encoding and the precision it is used at.
+
+    Raises:
+        ValueError: If ``encoding`` is not one of ``ENCODINGS``, or if it is a
+            packed encoding and ``precision`` decimals can overflow its 32-bit
+            integers.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown geometry encoding: {encoding!r} (expected one of {ENCODINGS})")
+    if encoding != "json" and MAX_DEGREES * 10**precision > INT32_MAX:
+        raise ValueError(
+            f"{precision} decimals overflow the 32-bit {encoding!r} encoding; use fewer or \"json\""
+        )
+
+
+def _polyline_chars(values: Sequence[int]) -> str:
+    out = []
+    for v in values:
+        v = ~(v << 1) if v < 0 else v << 1
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def pack(seqs: Sequence[Sequence[Sequence[int]]], encoding: str) -> Dict[str, Any]:
+    """Pack sequences of integer pairs into one encoded string.
+
+    Args:
+        seqs: Sequences of ``[a, b]`` integer pairs (already delta-encoded).
+        encoding: ``"polyline"`` or ``"int32"``.
+
+    Raises:
+        ValueError: If ``encoding`` is not a packed encoding, or if a value does
+            not fit in 32 bits.
+    """
+    flat = [int(v) for seq in seqs for pair in seq for v in pair]
+    if flat and max(map(abs, flat)) > INT32_MAX:
+        raise ValueError(f"Value out of the 32-bit range of the {encoding!r} encoding")
+    if encoding == "polyline":
+        data = _polyline_chars(flat)
+    elif encoding == "int32":
+        data = base64.b64encode(np.asarray(flat, dtype="<i4").tobytes()).decode("ascii")
+    else:
+        raise ValueError(f"Unknown geometry encoding: {encoding!r}")
+    return {"n": [len(seq) for seq in seqs], "d": data}
+
+
+def delta_ints(ring: Sequence[Sequence[float]], precision: int) -> List[List[int]]:
+    """Quantize a coordinate sequence to ``precision`` decimals and delta-encode it.
+
+    The first pair is absolute, every following pair is relative to the
+    previous one.
+    """
+    q = np.rint(np.asarray(ring, dtype=float)[:, :2] * 10.0**precision).astype(np.int64)
+    q[1:] = np.diff(q, axis=0)
+    return q.tolist()
+
+
+def pack_geometry(shape: Dict[str, Any], precision: int, encoding: str) -> Dict[str, Any]:
+    """Pack a Polygon/MultiPolygon shape for the client-side decoder.
+
+    Returns:
+        ``{"type", "parts", "packed"}`` where ``parts`` holds the number of rings
+        of each polygon and ``packed`` the delta-encoded rings, in order.
+    """
+    geom = geometry_of(shape)
+    polys = [geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]
+    rings = [delta_ints(r, precision) for p in polys for r in p]
+    return {"type": geom["type"], "parts": [len(p) for p in polys], "packed": pack(rings, encoding)}
@@ -0,0 +1,421 @@
+"""
+Boundary data access for the map builder.
+
+Two boundary layouts are supported:
+
+- ``georef``: a JSON list of province records, each with ``prov_name``,
+  ``prov_code`` and a nested ``geo_shape`` Feature
+  (``data/georef-spain-provincia.json``).
+- ``FeatureCollection``: a GeoJSON FeatureCollection whose features carry a
+  ``NAME`` (and ``ISO3``) property (``data/world.json``).
+
+The provinces file is large (~11 MB) and continent-scale files are larger, so
+nothing here ever materializes a whole file: :func:`iter_records` streams the
+raw bytes of one record at a time and :func:`stream_shapes` decodes only the
+records whose name or code was asked for. A one-time :class:`OffsetIndex` pass
+records the byte range of every record so that later misses decode a single
+slice of the file. Extracted shapes are indexed by name and code for O(1)
+lookups and kept in a binary sidecar under ``CACHE_DIR`` so that later builds
+do not read the source file at all.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import re
+import struct
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+# Sidecar caches live outside ``data/`` and are never committed.
+CACHE_DIR: Path | None = Path(__file__).resolve().parent.parent / ".cache"
+
+
+def _record_keys(record: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(key, shape)`` pairs under which a boundary record is indexed.
+
+    Georef records are indexed by ``prov_name`` and ``prov_code``; GeoJSON
+    features by their ``NAME`` and ``ISO3`` properties.
+    """
+    if "geo_shape" in record:
+        for key in (record.get("prov_name"), record.get("prov_code")):
+            if key:
+                yield key, record["geo_shape"]
+    else:
+        props = record.get("properties") or {}
+        for key in (props.get("NAME"), props.get("ISO3")):
+            if key:
+                yield key, record["geometry"]
+
+
+# One token per string, innermost number array (a coordinate pair) or bracket.
+# A lone quote only matches when a string is cut off at the end of the buffer.
+_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|\[[^\[\]{}"]*\]|[\[\]{}"]')
+_QUOTE, _OPEN_LIST, _OPEN_OBJ, _CLOSE_OBJ = b'"[{}'
+# Container stacks under which an object is a record: the top-level georef
+# list, or the ``features`` array of a top-level FeatureCollection.
+_RECORD_PARENTS = (b"[", b"{[")
+
+
+def iter_records(path: Path, chunk_size: int = 1 << 20) -> Iterator[Tuple[int, int, bytes]]:
+    """Stream the boundary records of ``path`` without decoding the file.
+
+    The file is read in ``chunk_size`` blocks and scanned for JSON structure
+    only; the bytes of a record are held until its closing brace and released
+    as soon as it has been yielded, so memory is bounded by the largest record.
+
+    Args:
+        path: A georef list or a GeoJSON FeatureCollection.
+        chunk_size: Number of bytes read per block.
+
+    Yields:
+        ``(start, end, raw)``: absolute byte offsets of the record and its bytes.
+    """
+    stack = bytearray()
+    buf = b""
+    base = 0  # absolute offset of buf[0]
+    pos = 0
+    rec_start = -1
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buf += chunk
+            for m in _TOKEN.finditer(buf, pos):
+                tok = m.start()
+                c = buf[tok]
+                if c == _QUOTE:
+                    if m.end() - tok == 1:
+                        break  # string continues in the next chunk
+                elif m.end() - tok > 1:
+                    pass  # complete number array: no effect on nesting
+                elif c == _OPEN_LIST or c == _OPEN_OBJ:
+                    if c == _OPEN_OBJ and stack in _RECORD_PARENTS:
+                        rec_start = base + tok
+                    stack.append(c)
+                else:
+                    stack.pop()
+                    if c == _CLOSE_OBJ and rec_start >= 0 and stack in _RECORD_PARENTS:
+                        yield rec_start, base + m.end(), buf[rec_start - base : m.end()]
+                        rec_start = -1
+                pos = m.end()
+            else:
+                pos = len(buf)
+            keep = rec_start - base if rec_start >= 0 else pos
+            buf = buf[keep:]
+            base += keep
+            pos -= keep
+
+
+def stream_shapes(path: Path, keys: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(key, shape)`` for every record of ``path`` matching one of ``keys``.
+
+    Records are pre-filtered on their raw bytes and only candidates that mention
+    a wanted key are decoded, so peak memory scales with the requested shapes
+    rather than with the file.
+    """
+    wanted = set(keys)
+    needles = {json.dumps(k, ensure_ascii=a).encode() for k in wanted for a in (True, False)}
+    for _, _, raw in iter_records(path):
+        if not any(n in raw for n in needles):
+            continue
+        for key, shape in _record_keys(json.loads(raw)):
+            if key in wanted:
+                yield key, shape
+
+
+def _file_digest(path: Path) -> str:
+    """Return the SHA-256 hex digest of the file at ``path``."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SourceStamp:
+    """Size, mtime and (lazily computed) SHA-256 of a source file.
+
+    Sidecars store :meth:`key` in their header and call :meth:`check` before
+    trusting their contents. Hashing only happens when size or mtime moved.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._digest: str | None = None
+
+    def key(self, digest: bool = True) -> Dict[str, Any]:
+        """Return ``size``/``mtime_ns`` (and ``sha256`` if ``digest``) of the file."""
+        st = self.path.stat()
+        key: Dict[str, Any] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if digest:
+            if self._digest is None:
+                self._digest = _file_digest(self.path)
+            key["sha256"] = self._digest
+        return key
+
+    def check(self, header: Dict[str, Any]) -> Tuple[bool, bool]:
+        """Compare a sidecar header with the file.
+
+        Returns:
+            ``(fresh, touched)``: whether the sidecar still describes the file,
+            and whether only its mtime changed (the header should be refreshed).
+        """
+        key = self.key(digest=False)
+        if (header["size"], header["mtime_ns"]) == (key["size"], key["mtime_ns"]):
+            return True, False
+        key = self.key(digest=True)
+        fresh = (header["size"], header["sha256"]) == (key["size"], key["sha256"])
+        return fresh, fresh
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write ``data`` to ``path`` through a temporary file and a rename."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class GeometryCache:
+    """Binary sidecar holding the shapes already extracted from one source file.
+
+    Layout: ``MAGIC``, a ``!HI`` pair (format version, header length), a JSON
+    header and a zlib-compressed :mod:`marshal` payload mapping keys to shapes.
+    The header records the source file's size, mtime and SHA-256 digest plus a
+    CRC of the payload. A sidecar is reused when size and mtime match; if only
+    the mtime moved (e.g. a fresh checkout) the digest decides. Stale, truncated
+    or otherwise unreadable sidecars are treated as empty and overwritten on the
+    next :meth:`update`.
+
+    Args:
+        stamp: Stamp of the boundary file the shapes come from.
+        cache_dir: Directory holding the sidecar.
+    """
+
+    MAGIC = b"IMGC"
+    VERSION = 1
+
+    def __init__(self, stamp: SourceStamp, cache_dir: Path) -> None:
+        self.stamp = stamp
+        self.path = cache_dir / f"{stamp.path.name}.geomcache"
+        self._shapes: Dict[str, Dict[str, Any]] | None = None
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            blob = self.path.read_bytes()
+        except FileNotFoundError:
+            return {}
+        try:
+            if blob[:4] != self.MAGIC:
+                raise ValueError("bad magic")
+            version, hlen = struct.unpack_from("!HI", blob, 4)
+            if version != self.VERSION:
+                raise ValueError(f"unsupported version {version}")
+            start = 4 + struct.calcsize("!HI")
+            header = json.loads(blob[start : start + hlen])
+            payload = blob[start + hlen :]
+            if header["marshal"] != marshal.version or zlib.crc32(payload) != header["crc32"]:
+                raise ValueError("corrupt payload")
+            fresh, touched = self.stamp.check(header)
+            if not fresh:
+                return {}
+            shapes = marshal.loads(zlib.decompress(payload))
+            if touched:
+                # Content unchanged but the file was touched: refresh the key.
+                try:
+                    self._write(shapes)
+                except OSError:
+                    pass
+            return shapes
+        except (ValueError, KeyError, TypeError, EOFError, struct.error, zlib.error):
+            return {}
+
+    def _write(self, shapes: Dict[str, Dict[str, Any]]) -> None:
+        payload = zlib.compress(marshal.dumps(shapes), 6)
+        header = self.stamp.key()
+        header.update(crc32=zlib.crc32(payload), marshal=marshal.version)
+        hbytes = json.dumps(header).encode()
+        _write_atomic(self.path, self.MAGIC + struct.pack("!HI", self.VERSION, len(hbytes)) + hbytes + payload)
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        """Return the cached shape for ``key`` or ``None`` on a miss."""
+        if self._shapes is None:
+            self._shapes = self._read()
+        return self._shapes.get(key)
+
+    def update(self, shapes: Dict[str, Dict[str, Any]]) -> None:
+        """Add ``shapes`` (key to shape) and persist the sidecar atomically."""
+        if self._shapes is None:
+            self._shapes = self._read()
+        self._shapes.update(shapes)
+        try:
+            self._write(self._shapes)
+        except OSError:
+            pass  # A read-only checkout still builds, just without the cache.
+
+
+class OffsetIndex:
+    """Sidecar recording the byte range of every record in a boundary file.
+
+    The index is built by one :func:`iter_records` pass and stored as JSON
+    (``<source>.offsets``) next to the source stamp. Lookups then ``mmap`` the
+    source and decode only the slice of the requested record, so fetching a
+    region costs O(region size) and concurrent builds share the page cache
+    instead of each holding a parsed copy. A stale or unreadable index is
+    rebuilt on first use.
+
+    Args:
+        stamp: Stamp of the boundary file to index.
+        cache_dir: Directory holding the sidecar.
+    """
+
+    VERSION = 1
+
+    def __init__(self, stamp: SourceStamp, cache_dir: Path) -> None:
+        self.stamp = stamp
+        self.path = cache_dir / f"{stamp.path.name}.offsets"
+        self._ranges: Dict[str, Tuple[int, int]] | None = None
+
+    def _read(self) -> Dict[str, Tuple[int, int]] | None:
+        try:
+            header = json.loads(self.path.read_bytes())
+            if header["version"] != self.VERSION:
+                return None
+            fresh, touched = self.stamp.check(header)
+            if not fresh:
+                return None
+            ranges = {k: (int(a), int(b)) for k, (a, b) in header["ranges"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if touched:
+            self._write(ranges)
+        return ranges
+
+    def _write(self, ranges: Dict[str, Tuple[int, int]]) -> None:
+        header = self.stamp.key()
+        header.update(version=self.VERSION, ranges=ranges)
+        try:
+            _write_atomic(self.path, json.dumps(header, ensure_ascii=False).encode())
+        except OSError:
+            pass
+
+    def _build(self) -> Dict[str, Tuple[int, int]]:
+        ranges = {
+            key: (start, end)
+            for start, end, raw in iter_records(self.stamp.path)
+            for key, _ in _record_keys(json.loads(raw))
+        }
+        self._write(ranges)
+        return ranges
+
+    def ranges(self) -> Dict[str, Tuple[int, int]]:
+        """Return ``key -> (start, end)`` for every record, building it if needed."""
+        if self._ranges is None:
+            self._ranges = self._read()
+            if self._ranges is None:
+                self._ranges = self._build()
+        return self._ranges
+
+    def read(self, keys: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``(key, shape)`` for each indexed key, decoding only its slice."""
+        ranges = self.ranges()
+        hits = [k for k in keys if k in ranges]
+        if not hits:
+            return
+        with self.stamp.path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for k in hits:
+                start, end = ranges[k]
+                yield k, dict(_record_keys(json.loads(mm[start:end])))[k]
+
+
+class ProvinceRegistry:
+    """Name-indexed registry of the shapes contained in one boundary file.
+
+    Lookups are served from memory, then from the :class:`GeometryCache`
+    sidecar, then by decoding single records through the :class:`OffsetIndex`.
+    Without a cache directory, misses fall back to one streaming pass over the
+    source file that extracts every missing key at once.
+
+    Args:
+        path: Filesystem path to a georef list or a GeoJSON FeatureCollection.
+        cache_dir: Directory for the sidecars; ``None`` disables them.
+    """
+
+    def __init__(self, path: Path, cache_dir: Path | None = None) -> None:
+        self.path = path
+        self.cache: GeometryCache | None = None
+        self.index: OffsetIndex | None = None
+        if cache_dir is not None:
+            stamp = SourceStamp(path)
+            self.cache = GeometryCache(stamp, cache_dir)
+            self.index = OffsetIndex(stamp, cache_dir)
+        self._shapes: Dict[str, Dict[str, Any]] = {}
+
+    def shapes(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the shapes registered under ``keys`` (names or codes).
+
+        Raises:
+            KeyError: If any key matches no record.
+        """
+        keys = list(keys)
+        missing = [k for k in keys if k not in self._shapes]
+        if missing and self.cache is not None:
+            for k in missing:
+                shape = self.cache.get(k)
+                if shape is not None:
+                    self._shapes[k] = shape
+            missing = [k for k in missing if k not in self._shapes]
+        if missing:
+            if self.index is not None:
+                found = dict(self.index.read(missing))
+            else:
+                found = dict(stream_shapes(self.path, missing))
+            self._shapes.update(found)
+            if self.cache is not None and found:
+                self.cache.update(found)
+            absent = [k for k in missing if k not in found]
+            if absent:
+                raise KeyError(f"{', '.join(map(repr, absent))} not found in {self.path.name}")
+        return {k: self._shapes[k] for k in keys}
+
+    def shape(self, key: str) -> Dict[str, Any]:
+        """Return the shape registered under ``key`` (a name or a code).
+
+        Raises:
+            KeyError: If no record matches ``key``.
+        """
+        return self.shapes([key])[key]
+
+
+@lru_cache(maxsize=None)
+def registry_for(path: Path) -> ProvinceRegistry:
+    """Return the process-wide registry for ``path`` (one per file)."""
+    return ProvinceRegistry(path, CACHE_DIR)
+
+
+def load_provinces(name: str, path: Path) -> Dict[str, Any]:
+    """Return the shape of the region ``name`` from the boundary file at ``path``.
+
+    Georef records yield their ``geo_shape`` Feature, FeatureCollection entries
+    their ``geometry``; both can be fed straight into Folium. Repeated calls
+    against the same file share one registry, and shapes fetched by earlier
+    builds come from the geometry sidecar without touching the source.
+
+    Args:
+        name: Region name (``prov_name``/``NAME``) or code (``prov_code``/``ISO3``).
+        path: Filesystem path to the boundary file.
+
+    Returns:
+        A GeoJSON-like mapping suitable to feed into Folium.
+
+    Raises:
+        KeyError: If the region cannot be found in the file.
+    """
+    return registry_for(path).shape(name)
@@ -0,0 +1,226 @@
+"""
+Geometry post-processing applied between loading a region and rendering it.
+
+Boundary files ship at survey resolution, far beyond what a web map can show,
+and every vertex ends up in the generated HTML. The functions here reduce
+polygons with NumPy-vectorized Douglas–Peucker or Visvalingam–Whyatt
+simplification, optionally into a pyramid of zoom-dependent levels of detail.
+Shapes may be bare GeoJSON geometries or Features (as found in the georef
+file); ``Polygon`` and ``MultiPolygon`` are supported and any other geometry
+passes through untouched.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+Ring = List[List[float]]
+
+
+def _segment_distances(pts: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distances from each row of ``pts`` to the segment ``a``–``b``."""
+    ab = b - a
+    denom = float(ab @ ab)
+    if denom == 0.0:
+        return np.hypot(*(pts - a).T)
+    t = np.clip(((pts - a) @ ab) / denom, 0.0, 1.0)
+    return np.hypot(*(pts - (a + t[:, None] * ab)).T)
+
+
+def _douglas_peucker(pts: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return a keep-mask for an open polyline (endpoints are always kept)."""
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        d = _segment_distances(pts[start + 1 : end], pts[start], pts[end])
+        i = int(np.argmax(d))
+        if d[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return keep
+
+
+def _visvalingam(pts: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return a keep-mask for an open polyline (endpoints are always kept).
+
+    Each pass computes the effective triangle area of every remaining vertex at
+    once and drops the vertices that are below ``tolerance ** 2`` and smaller
+    than both neighbours, so no two adjacent vertices go in the same pass.
+    """
+    threshold = tolerance * tolerance
+    idx = np.arange(len(pts))
+    while len(idx) > 2:
+        p = pts[idx]
+        a, b, c = p[:-2], p[1:-1], p[2:]
+        area = 0.5 * np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1]))
+        padded = np.concatenate(([np.inf], area, [np.inf]))
+        drop = (area < threshold) & (area < padded[:-2]) & (area <= padded[2:])
+        if not drop.any():
+            break
+        idx = np.concatenate((idx[:1], idx[1:-1][~drop], idx[-1:]))
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[idx] = True
+    return keep
+
+
+METHODS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    "dp": _douglas_peucker,
+    "vw": _visvalingam,
+}
+
+
+def simplify_line(coords: Ring, tolerance: float, method: str = "dp") -> Ring:
+    """Simplify an open polyline, always keeping both endpoints.
+
+    Args:
+        coords: ``[lon, lat]`` pairs.
+        tolerance: Maximum deviation in coordinate units (degrees).
+        method: ``"dp"`` (Douglas–Peucker) or ``"vw"`` (Visvalingam–Whyatt).
+    """
+    if tolerance <= 0 or len(coords) < 3:
+        return coords
+    pts = np.asarray(coords, dtype=float)
+    return pts[METHODS[method](pts, tolerance)].tolist()
+
+
+def simplify_ring(coords: Ring, tolerance: float, method: str = "dp") -> Ring:
+    """Simplify a closed linear ring, keeping it closed and non-degenerate.
+
+    The ring is split at the vertex farthest from its first vertex and both
+    halves are simplified as open lines, which guarantees at least three
+    distinct vertices (four positions) survive.
+    """
+    if tolerance <= 0 or len(coords) <= 4:
+        return coords
+    pts = np.asarray(coords, dtype=float)
+    far = int(np.argmax(np.hypot(*(pts - pts[0]).T)))
+    if far in (0, len(pts) - 1):
+        return coords
+    simplify = METHODS[method]
+    keep = np.concatenate((simplify(pts[: far + 1], tolerance), simplify(pts[far:], tolerance)[1:]))
+    if keep.sum() < 4:
+        # Both halves collapsed to their endpoints: keep the widest remaining vertex.
+        d = _segment_distances(pts, pts[0], pts[far])
+        d[[0, far, len(pts) - 1]] = -1
+        keep[int(np.argmax(d))] = True
+    return pts[keep].tolist()
+
+
+def geometry_of(shape: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the geometry of a Feature, or ``shape`` itself if it is one."""
+    return shape["geometry"] if shape.get("type") == "Feature" else shape
+
+
+def _map_rings(shape: Dict[str, Any], fn: Callable[[Ring], Ring]) -> Dict[str, Any]:
+    """Return a copy of ``shape`` with ``fn`` applied to every polygon ring."""
+    geom = geometry_of(shape)
+    if geom["type"] == "Polygon":
+        coords: Any = [fn(r) for r in geom["coordinates"]]
+    elif geom["type"] == "MultiPolygon":
+        coords = [[fn(r) for r in poly] for poly in geom["coordinates"]]
+    else:
+        return shape
+    new_geom = {**geom, "coordinates": coords}
+    return {**shape, "geometry": new_geom} if geom is not shape else new_geom
+
+
+def round_shape(shape: Dict[str, Any], decimals: int) -> Dict[str, Any]:
+    """Round every vertex of a (Multi)Polygon shape to ``decimals`` places.
+
+    Vertices that become equal to their predecessor are dropped. Rings left
+    with fewer than four positions are removed, and so are polygons whose
+    exterior ring collapsed. The input is not modified.
+    """
+    geom = geometry_of(shape)
+    if geom["type"] not in ("Polygon", "MultiPolygon"):
+        return shape
+
+    def round_ring(ring: Ring) -> Ring:
+        pts = np.round(np.asarray(ring, dtype=float), decimals)
+        return pts[np.concatenate(([True], np.any(pts[1:] != pts[:-1], axis=1)))].tolist()
+
+    def round_polygon(poly: List[Ring]) -> List[Ring]:
+        rings = [round_ring(r) for r in poly]
+        return [r for r in rings if len(r) >= 4] if len(rings[0]) >= 4 else []
+
+    if geom["type"] == "Polygon":
+        coords: Any = round_polygon(geom["coordinates"])
+    else:
+        coords = [p for p in (round_polygon(p) for p in geom["coordinates"]) if p]
+    new_geom = {**geom, "coordinates": coords}
+    return {**shape, "geometry": new_geom} if geom is not shape else new_geom
+
+
+def count_vertices(shape: Dict[str, Any]) -> int:
+    """Return the number of positions in a (Multi)Polygon shape."""
+    geom = geometry_of(shape)
+    if geom["type"] == "Polygon":
+        return sum(len(r) for r in geom["coordinates"])
+    if geom["type"] == "MultiPolygon":
+        return sum(len(r) for poly in geom["coordinates"] for r in poly)
+    return 0
+
+
+def simplify_shape(
+    shape: Dict[str, Any], tolerance: float, method: str = "dp"
+) -> Tuple[Dict[str, Any], int, int]:
+    """Simplify every ring of a Polygon/MultiPolygon shape.
+
+    The input is not modified; Features keep their properties.
+
+    Args:
+        shape: GeoJSON geometry or Feature.
+        tolerance: Maximum deviation in degrees; ``0`` disables simplification.
+        method: ``"dp"`` (Douglas–Peucker) or ``"vw"`` (Visvalingam–Whyatt).
+
+    Returns:
+        ``(simplified_shape, vertices_before, vertices_after)``.
+
+    Raises:
+        ValueError: If ``method`` is unknown.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown simplification method: {method!r}")
+    simplified = _map_rings(shape, lambda r: simplify_ring(r, tolerance, method))
+    return simplified, count_vertices(shape), count_vertices(simplified)
+
+
+def build_pyramid(
+    shape: Dict[str, Any],
+    levels: Sequence[Tuple[int, float]],
+    method: str = "dp",
+    min_gain: float = 0.25,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """Precompute levels of detail of ``shape`` for zoom-dependent rendering.
+
+    Each level is simplified from the source shape, not from the previous level,
+    so errors do not accumulate. A coarse level that does not drop at least
+    ``min_gain`` of the vertices of the next finer one is not worth its bytes
+    and is merged into it.
+
+    Args:
+        shape: GeoJSON geometry or Feature at source resolution.
+        levels: ``(min_zoom, tolerance)`` pairs in ascending zoom order; the
+            shape of a level is shown from its ``min_zoom`` up to the next one.
+        method: Simplification method, see :func:`simplify_shape`.
+        min_gain: Minimum fraction of vertices a coarser level must save.
+
+    Returns:
+        ``(min_zoom, shape)`` pairs, coarsest first. Without levels the source
+        shape is returned as a single level starting at zoom 0.
+    """
+    pyramid: List[Tuple[int, Dict[str, Any]]] = []
+    for min_zoom, tolerance in reversed(levels):
+        simplified, _, after = simplify_shape(shape, tolerance, method)
+        if pyramid and after > (1 - min_gain) * count_vertices(pyramid[-1][1]):
+            pyramid[-1] = (min_zoom, pyramid[-1][1])
+        else:
+            pyramid.append((min_zoom, simplified))
+    return pyramid[::-1] or [(0, shape)]
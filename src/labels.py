@@ -0,0 +1,76 @@
+"""
+Build-time placement of peak labels.
+
+Drawn at every zoom, names pile up wherever peaks are dense (e.g. the Aralar
+range). :func:`place_labels` decides once, at build time, from which zoom level
+each label can be shown without overlapping another one: at every zoom the
+labels are placed greedily in priority order, each accepted only if its box is
+clear of those already placed, which are looked up in a spatial grid. A label
+placed at one zoom stays placed at every higher zoom (the distance between two
+points doubles with each zoom while label boxes keep their pixel size), so the
+result is a single minimum zoom per peak.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from clustering import TILE_SIZE, project
+
+# Approximate box of a 12 px bold label, in pixels: width per character and
+# height, and the gap between the peak and the top of its label.
+CHAR_WIDTH = 7
+LABEL_HEIGHT = 14
+LABEL_OFFSET = 19
+
+Box = Tuple[float, float, float, float]
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def place_labels(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    names: Sequence[str],
+    order: Sequence[int],
+    max_zoom: int = 18,
+    cell: int = 64,
+) -> List[int]:
+    """Compute the zoom level from which each label fits without collisions.
+
+    Args:
+        lat: Latitudes of the peaks.
+        lon: Longitudes of the peaks.
+        names: Label texts (their length sets the label width).
+        order: Peak positions by decreasing priority; earlier labels win.
+        max_zoom: Highest zoom level considered.
+        cell: Size in pixels of the grid cells indexing placed labels.
+
+    Returns:
+        The minimum label zoom of every peak, or ``max_zoom + 1`` for labels
+        that collide up to ``max_zoom``.
+    """
+    x, y = project(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+    half = [len(str(n)) * CHAR_WIDTH / 2 for n in names]
+    min_zoom = [max_zoom + 1] * len(half)
+    for z in range(max_zoom + 1):
+        scale = TILE_SIZE * 2**z
+        grid: Dict[Tuple[int, int], List[Box]] = {}
+        # Labels placed at lower zooms go first: they cannot collide now.
+        for i in sorted(order, key=lambda i: min_zoom[i] > z):
+            px, py = x[i] * scale, y[i] * scale
+            box = (px - half[i], py + LABEL_OFFSET, px + half[i], py + LABEL_OFFSET + LABEL_HEIGHT)
+            cells = [
+                (cx, cy)
+                for cx in range(int(box[0] // cell), int(box[2] // cell) + 1)
+                for cy in range(int(box[1] // cell), int(box[3] // cell) + 1)
+            ]
+            if min_zoom[i] > z and any(_overlaps(box, b) for c in cells for b in grid.get(c, ())):
+                continue
+            for c in cells:
+                grid.setdefault(c, []).append(box)
+            min_zoom[i] = min(min_zoom[i], z)
+    return min_zoom
@@ -0,0 +1,192 @@
+"""
+TopoJSON encoding of region shapes.
+
+Neighbouring provinces share long borders; encoded as separate GeoJSON those
+borders are serialized once per province. :func:`build_topology` converts a set
+of shapes into a single TopoJSON topology in which every boundary segment is
+stored exactly once as a quantized, delta-encoded arc, and polygons refer to
+arcs by index (``~i`` for an arc traversed backwards).
+
+The usual TopoJSON construction is followed: coordinates are snapped to a grid
+of ``quantum`` degrees, vertices whose neighbours differ between rings become
+junctions, rings are cut into arcs at junctions and identical arcs (in either
+direction) are deduplicated. Levels of detail are produced by simplifying the
+arcs themselves, so shared borders stay shared at every level. A level is
+kept when it saves enough vertices overall, as :func:`geometry.build_pyramid`
+decides per region, and only stores the arcs it simplifies enough; the others
+are taken from the next finer level.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from geometry import geometry_of, simplify_line, simplify_ring
+
+Point = Tuple[int, int]
+Arc = List[Point]
+
+
+def _polygons(geom: Dict[str, Any]) -> List[List[List[List[float]]]]:
+    """Return the polygons of a Polygon/MultiPolygon geometry as a list."""
+    if geom["type"] == "Polygon":
+        return [geom["coordinates"]]
+    if geom["type"] == "MultiPolygon":
+        return geom["coordinates"]
+    raise ValueError(f"Unsupported geometry type for topology: {geom['type']!r}")
+
+
+def _quantize(ring: List[List[float]], origin: np.ndarray, quantum: float) -> Arc:
+    """Snap a ring to the integer grid and drop consecutive duplicates."""
+    q = np.rint((np.asarray(ring, dtype=float)[:, :2] - origin) / quantum).astype(np.int64)
+    q = q[np.concatenate(([True], np.any(q[1:] != q[:-1], axis=1)))]
+    pts = [(int(x), int(y)) for x, y in q]
+    if pts[0] != pts[-1]:
+        pts.append(pts[0])
+    return pts
+
+
+def _junctions(rings: List[Arc]) -> set[Point]:
+    """Return the vertices where rings meet or part ways."""
+    neighbours: Dict[Point, frozenset] = {}
+    junctions: set[Point] = set()
+    for ring in rings:
+        n = len(ring) - 1
+        for i in range(n):
+            p = ring[i]
+            pair = frozenset((ring[i - 1] if i else ring[n - 1], ring[i + 1]))
+            seen = neighbours.setdefault(p, pair)
+            if seen != pair:
+                junctions.add(p)
+    return junctions
+
+
+def _cut(ring: Arc, junctions: set[Point]) -> List[Arc]:
+    """Split a closed ring into arcs that start and end at junctions."""
+    body = ring[:-1]
+    cuts = [i for i, p in enumerate(body) if p in junctions]
+    if not cuts:
+        # A ring touching nothing: canonical rotation so duplicates match.
+        k = min(range(len(body)), key=body.__getitem__)
+        return [body[k:] + body[:k] + [body[k]]]
+    k = cuts[0]
+    rotated = body[k:] + body[:k] + [body[k]]
+    cuts = [i - k for i in cuts] + [len(body)]
+    return [rotated[a : b + 1] for a, b in zip(cuts, cuts[1:])]
+
+
+def _simplify_arc(arc: Arc, tolerance: float, method: str) -> Arc:
+    if tolerance <= 0:
+        return arc
+    if arc[0] == arc[-1]:
+        out = simplify_ring([list(p) for p in arc], tolerance, method)
+    else:
+        out = simplify_line([list(p) for p in arc], tolerance, method)
+    return [(int(x), int(y)) for x, y in out]
+
+
+def _delta(arc: Arc) -> List[List[int]]:
+    out = [list(arc[0])]
+    out.extend([x1 - x0, y1 - y0] for (x0, y0), (x1, y1) in zip(arc, arc[1:]))
+    return out
+
+
+def build_topology(
+    shapes: Dict[str, Dict[str, Any]],
+    levels: Sequence[Tuple[int, float]] = ((0, 0.0),),
+    quantum: float = 1e-5,
+    method: str = "dp",
+    min_gain: float = 0.25,
+) -> Tuple[Dict[str, Any], List[Tuple[int, List[int], List[List[List[int]]]]]]:
+    """Encode ``shapes`` into one TopoJSON topology with shared arcs.
+
+    Args:
+        shapes: Region id to GeoJSON geometry or Feature (Polygon/MultiPolygon).
+        levels: ``(min_zoom, tolerance)`` pairs in ascending zoom order; arcs are
+            simplified once per level (tolerance in degrees).
+        quantum: Grid size in degrees; ``1e-5`` is about one metre.
+        method: Simplification method, see :func:`geometry.simplify_shape`.
+        min_gain: Minimum fraction of the vertices of the next finer level a
+            coarser level must save, otherwise it is merged into it (as in
+            :func:`geometry.build_pyramid`). A kept level only stores the arcs
+            that save that fraction too; the others are barely simpler than
+            their finer version, which it reuses.
+
+    Returns:
+        ``(topology, arc_levels)``: a standard TopoJSON topology whose ``arcs``
+        are those of the finest level, with a single ``regions``
+        GeometryCollection (one geometry per id), and the levels as
+        ``(min_zoom, ids, arcs)`` triples, coarsest first: the delta-encoded
+        arcs a level stores and their ids. The finest level stores every arc,
+        coarser ones only the arcs they simplify further; an arc missing from
+        a level is the one of the next finer level.
+    """
+    geoms = {rid: geometry_of(shape) for rid, shape in shapes.items()}
+    polys = {rid: _polygons(g) for rid, g in geoms.items()}
+    origin = np.min(
+        [np.asarray(r, dtype=float)[:, :2].min(axis=0) for ps in polys.values() for p in ps for r in p],
+        axis=0,
+    )
+    # Snap the origin to the grid so the translate carries no spurious digits.
+    digits = max(0, math.ceil(-math.log10(quantum)))
+    origin = np.round(np.floor(origin / quantum) * quantum, digits)
+    rings: Dict[str, List[List[Arc]]] = {}
+    for rid, ps in polys.items():
+        kept = []
+        for p in ps:
+            qs = [_quantize(r, origin, quantum) for r in p]
+            # Rings that collapse on the grid are dropped, along with the
+            # polygon itself when its exterior collapsed.
+            if len(qs[0]) >= 4:
+                kept.append([q for q in qs if len(q) >= 4])
+        rings[rid] = kept
+    junctions = _junctions([r for ps in rings.values() for p in ps for r in p])
+
+    arcs: List[Arc] = []
+    index: Dict[Tuple[Point, ...], int] = {}
+
+    def arc_id(arc: Arc) -> int:
+        key = tuple(arc)
+        if key in index:
+            return index[key]
+        rkey = key[::-1]
+        if rkey in index:
+            return ~index[rkey]
+        index[key] = len(arcs)
+        arcs.append(arc)
+        return index[key]
+
+    geometries = []
+    for rid, ps in rings.items():
+        refs = [[[arc_id(a) for a in _cut(r, junctions)] for r in p] for p in ps]
+        if geoms[rid]["type"] == "Polygon":
+            geometries.append({"type": "Polygon", "id": rid, "arcs": refs[0]})
+        else:
+            geometries.append({"type": "MultiPolygon", "id": rid, "arcs": refs})
+
+    # Finest level first; ``current`` holds the version of each arc in use at
+    # the level being built.
+    arc_levels: List[Tuple[int, Dict[int, Arc]]] = []
+    current = list(arcs)
+    for min_zoom, tolerance in reversed(levels or ((0, 0.0),)):
+        simplified = [_simplify_arc(a, tolerance / quantum, method) for a in arcs]
+        if arc_levels and sum(map(len, simplified)) > (1 - min_gain) * sum(map(len, current)):
+            arc_levels[-1] = (min_zoom, arc_levels[-1][1])
+            continue
+        stored = {
+            i: a for i, a in enumerate(simplified) if not arc_levels or len(a) <= (1 - min_gain) * len(current[i])
+        }
+        current = [stored.get(i, a) for i, a in enumerate(current)]
+        arc_levels.append((min_zoom, stored))
+    arc_levels.reverse()
+
+    encoded = [(z, list(stored), [_delta(a) for a in stored.values()]) for z, stored in arc_levels]
+    topology = {
+        "type": "Topology",
+        "transform": {"scale": [quantum, quantum], "translate": [float(origin[0]), float(origin[1])]},
+        "objects": {"regions": {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": encoded[-1][2],
+    }
+    return topology, encoded
@@ -0,0 +1,55 @@
+"""Tests for the script tokenizer of :func:`artifacts.minify_js`."""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from artifacts import minify_js  # noqa: E402
+
+
+class MinifyJsTest(unittest.TestCase):
+    def test_whitespace(self):
+        self.assertEqual(minify_js("var  x = { a : 1 } ;"), "var x={a:1};")
+
+    def test_comments(self):
+        self.assertEqual(minify_js("a(); // note\nb(); /* block */ c();"), "a();b();c();")
+        self.assertEqual(minify_js("/*! kept */\na();"), "/*! kept */\na();")
+        self.assertEqual(minify_js("/* @license MIT */ a();"), "/* @license MIT */\na();")
+
+    def test_strings_are_copied(self):
+        self.assertEqual(minify_js('x = "a  // b" + \'/* c */\';'), 'x="a  // b"+\'/* c */\';')
+        self.assertEqual(minify_js('x = "say \\"hi  there\\"";'), 'x="say \\"hi  there\\"";')
+        self.assertEqual(minify_js("x = `a  ${ b }\n  c`;"), "x=`a  ${ b }\n  c`;")
+
+    def test_regex_after_operator_or_keyword(self):
+        self.assertEqual(minify_js("x = / a b/g;"), "x=/ a b/g;")
+        self.assertEqual(minify_js("return / a b/.test(s);"), "return/ a b/.test(s);")
+        self.assertEqual(minify_js("f(/ a /, / b /);"), "f(/ a /,/ b /);")
+        self.assertEqual(minify_js("x = /[/ ]/;"), "x=/[/ ]/;")
+
+    def test_regex_after_statement_head(self):
+        self.assertEqual(minify_js("if (x) / a b/.test(y) && z();"), "if(x)/ a b/.test(y)&&z();")
+        self.assertEqual(minify_js("while (f(a)) / x /g.exec(s);"), "while(f(a))/ x /g.exec(s);")
+        self.assertEqual(minify_js("for (;;) / a /.test(s);"), "for(;;)/ a /.test(s);")
+
+    def test_division_after_parenthesis(self):
+        self.assertEqual(minify_js("q = (a) / b / c;"), "q=(a)/b/c;")
+        self.assertEqual(minify_js("q = f(x) / 2 / y;"), "q=f(x)/2/y;")
+        self.assertEqual(minify_js("if (g(1)) x = (y) / 2 / z;"), "if(g(1))x=(y)/2/z;")
+        self.assertEqual(minify_js("q = a / b / c;"), "q=a/b/c;")
+
+    def test_operators_that_must_stay_apart(self):
+        self.assertEqual(minify_js("x = a - -b + +c;"), "x=a- -b+ +c;")
+        self.assertEqual(minify_js("x = a / /re/.source.length;"), "x=a/ /re/.source.length;")
+        self.assertEqual(minify_js("return typeof x;"), "return typeof x;")
+
+    def test_line_breaks_that_end_statements(self):
+        self.assertEqual(minify_js("a = 1\nb = 2"), "a=1\nb=2")
+        self.assertEqual(minify_js("return\nx"), "return\nx")
+        self.assertEqual(minify_js("i++\nj"), "i++\nj")
+        self.assertEqual(minify_js("f(a,\n  b)\n.then(c)"), "f(a,b).then(c)")
+
+
+if __name__ == "__main__":
+    unittest.main()
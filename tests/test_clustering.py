@@ -0,0 +1,55 @@
+"""Tests for the build-time peak clustering of :mod:`clustering`."""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from clustering import build_cluster_levels  # noqa: E402
+
+# Three peaks within a few hundred metres, one 3 km away, one on another continent.
+LAT = [43.0, 43.001, 43.002, 43.03, -33.9]
+LON = [-2.0, -2.001, -1.999, -2.0, 151.2]
+IDS = [10, 11, 12, 13, 14]
+
+
+class ClusterLevelsTest(unittest.TestCase):
+    def setUp(self):
+        self.levels = build_cluster_levels(LAT, LON, IDS, radius=80, max_zoom=16)
+
+    def test_levels(self):
+        zooms = [z for z, _ in self.levels]
+        self.assertEqual(zooms[0], 0)
+        self.assertEqual(zooms, sorted(set(zooms)))
+        self.assertLessEqual(zooms[-1], 16)
+        for (_, a), (_, b) in zip(self.levels, self.levels[1:]):
+            self.assertNotEqual(a, b)
+
+    def test_counts(self):
+        for z, nodes in self.levels:
+            with self.subTest(zoom=z):
+                self.assertEqual(sum(n[2] for n in nodes), len(IDS))
+        self.assertEqual(sorted(n[2] for n in self.levels[0][1]), [1, 4])
+
+    def test_finest_level_holds_the_peaks(self):
+        nodes = self.levels[-1][1]
+        self.assertEqual([n[2] for n in nodes], [1] * len(IDS))
+        self.assertEqual([n[3] for n in nodes], IDS)
+        self.assertEqual([n[:2] for n in nodes], [[a, b] for a, b in zip(LAT, LON)])
+
+    def test_membership(self):
+        nodes = {n[2]: n for n in self.levels[0][1]}
+        # The far peak stays alone and keeps its id; the others merge near their centroid.
+        self.assertEqual(nodes[1][3], 14)
+        lat, lon, _, split = nodes[4]
+        self.assertTrue(43.0 <= lat <= 43.03 and -2.001 <= lon <= -1.999)
+        # A cluster's ref is the zoom at which it splits into finer nodes.
+        level = max((z, n) for z, n in self.levels if z <= split)[1]
+        self.assertEqual(sorted(n[2] for n in level if n[0] > 0), [1, 3])
+        self.assertIn([43.03, -2.0, 1, 13], level)
+        earlier = max((z, n) for z, n in self.levels if z < split)[1]
+        self.assertEqual(len([n for n in earlier if n[0] > 0]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Tests for the packed coordinate encodings of :mod:`encoding`."""
+import base64
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from encoding import INT32_MAX, check_encoding, delta_ints, pack, pack_geometry  # noqa: E402
+
+
+def unpack(packed, encoding):
+    """Decode a packed payload the way the page does, with 32-bit integers."""
+    if encoding == "int32":
+        values = np.frombuffer(base64.b64decode(packed["d"]), dtype="<i4").tolist()
+    else:
+        values, v, shift = [], 0, 0
+        for ch in packed["d"]:
+            c = ord(ch) - 63
+            v = (v | (c & 0x1F) << shift) & 0xFFFFFFFF
+            shift += 5
+            if c < 0x20:
+                values.append(~(v >> 1) if v & 1 else v >> 1)
+                v = shift = 0
+    pairs = [values[k : k + 2] for k in range(0, len(values), 2)]
+    out, k = [], 0
+    for n in packed["n"]:
+        out.append(pairs[k : k + n])
+        k += n
+    return out
+
+
+def undelta(seq):
+    return np.cumsum(np.asarray(seq), axis=0).tolist()
+
+
+class PackTest(unittest.TestCase):
+    SEQS = [[[-179999999, 89999999], [0, -1], [31, -32], [1024, -1025]], [], [[INT32_MAX, -INT32_MAX]]]
+
+    def test_round_trip(self):
+        for encoding in ("polyline", "int32"):
+            with self.subTest(encoding=encoding):
+                self.assertEqual(unpack(pack(self.SEQS, encoding), encoding), self.SEQS)
+
+    def test_delta_ints_round_trip(self):
+        ring = [[-2.123456, 43.1], [-2.1, 43.099999], [-2.123456, 43.1]]
+        deltas = delta_ints(ring, 6)
+        self.assertEqual(deltas[0], [-2123456, 43100000])
+        self.assertEqual(np.round(np.asarray(undelta(deltas)) / 1e6, 6).tolist(), ring)
+
+    def test_pack_geometry(self):
+        square = [[0, 0], [1, 0], [1, 1], [0, 0]]
+        shape = {"type": "MultiPolygon", "coordinates": [[square, square], [square]]}
+        packed = pack_geometry(shape, 5, "polyline")
+        self.assertEqual(packed["parts"], [2, 1])
+        rings = [undelta(r) for r in unpack(packed["packed"], "polyline")]
+        self.assertEqual(rings, [[[x * 10**5, y * 10**5] for x, y in square]] * 3)
+
+    def test_values_out_of_int32_are_rejected(self):
+        for encoding in ("polyline", "int32"):
+            with self.subTest(encoding=encoding), self.assertRaises(ValueError):
+                pack([[[-3598000000, 0]]], encoding)
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            pack([[[0, 0]]], "json")
+
+
+class CheckEncodingTest(unittest.TestCase):
+    def test_precision_limits(self):
+        for encoding in ("polyline", "int32"):
+            check_encoding(encoding, 6)
+            with self.subTest(encoding=encoding), self.assertRaises(ValueError):
+                check_encoding(encoding, 7)
+        check_encoding("json", 9)
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            check_encoding("int16", 5)
+
+    def test_limit_matches_the_decoder(self):
+        # A 360-degree delta at 6 decimals survives the 32-bit decoder.
+        seqs = [[[0, 0], [360 * 10**6, -360 * 10**6]]]
+        self.assertEqual(unpack(pack(seqs, "polyline"), "polyline"), seqs)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""Tests for the boundary file access of :mod:`geodata`."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import geodata  # noqa: E402
+from geodata import GeometryCache, OffsetIndex, ProvinceRegistry, SourceStamp, iter_records  # noqa: E402
+
+DATA = Path(__file__).resolve().parents[1] / "data"
+
+SQUARE = {"type": "Polygon", "coordinates": [[[0.5, 1.25], [2, 1.25], [2, -3e-05], [0.5, 1.25]]]}
+GEOREF = [
+    {"prov_name": "Plain", "prov_code": "01", "geo_shape": {"type": "Feature", "geometry": SQUARE}},
+    {"prov_name": 'Say "hi" \\ {there} [x]', "prov_code": "02", "geo_shape": {"geometry": SQUARE, "a": []}},
+    {"prov_name": "Unicode ñ ☃", "prov_code": "03", "geo_shape": {"geometry": None, "b": [{}, [[]]]}},
+]
+COLLECTION = {
+    "type": "FeatureCollection",
+    "name": "not a {record}",
+    "features": [
+        {"type": "Feature", "properties": {"NAME": "A}\\\"", "ISO3": "AAA"}, "geometry": SQUARE},
+        {"type": "Feature", "properties": {"NAME": "B", "tags": ["{", "]"]}, "geometry": SQUARE},
+    ],
+}
+
+
+class IterRecordsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, obj, **kwargs):
+        path = Path(self.tmp.name) / "boundaries.json"
+        path.write_text(json.dumps(obj, **kwargs), encoding="utf-8")
+        return path
+
+    def records(self, path, chunk_size=1 << 20):
+        data = path.read_bytes()
+        out = []
+        for start, end, raw in iter_records(path, chunk_size):
+            self.assertEqual(raw, data[start:end])
+            out.append(json.loads(raw))
+        return out
+
+    def test_georef_list(self):
+        self.assertEqual(self.records(self.write(GEOREF)), GEOREF)
+
+    def test_feature_collection(self):
+        self.assertEqual(self.records(self.write(COLLECTION)), COLLECTION["features"])
+
+    def test_escaped_quotes_and_braces_in_strings(self):
+        path = self.write(GEOREF, ensure_ascii=False, indent=2)
+        self.assertEqual([r["prov_name"] for r in self.records(path)], [r["prov_name"] for r in GEOREF])
+
+    def test_tokens_split_across_chunks(self):
+        for layout, expected in ((GEOREF, GEOREF), (COLLECTION, COLLECTION["features"])):
+            path = self.write(layout, ensure_ascii=False)
+            for chunk_size in (1, 2, 3, 7, 64):
+                with self.subTest(chunk_size=chunk_size):
+                    self.assertEqual(self.records(path, chunk_size), expected)
+
+    def test_empty_containers(self):
+        self.assertEqual(self.records(self.write([])), [])
+        self.assertEqual(self.records(self.write({"type": "FeatureCollection", "features": []})), [])
+
+    def test_bundled_files_match_json_load(self):
+        for name, key in (("georef-spain-provincia.json", None), ("world.json", "features")):
+            path = DATA / name
+            with self.subTest(name=name), path.open("rb") as f:
+                expected = json.load(f)
+                self.assertEqual(self.records(path), expected[key] if key else expected)
+
+
+class SidecarTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.source = Path(tmp.name) / "provinces.json"
+        self.cache_dir = Path(tmp.name) / "cache"
+        self.source.write_text(json.dumps(GEOREF), encoding="utf-8")
+
+    def registry(self):
+        return ProvinceRegistry(self.source, self.cache_dir)
+
+    def sidecars(self, registry):
+        return registry.cache.path, registry.index.path
+
+    def test_warm_build_reads_the_cache(self):
+        self.assertEqual(self.registry().shape("Plain"), GEOREF[0]["geo_shape"])
+        registry = self.registry()
+        self.assertEqual(registry.shape("Plain"), GEOREF[0]["geo_shape"])
+        self.assertIsNone(registry.index._ranges)  # the source was not indexed again
+
+    def test_stamp(self):
+        stamp = SourceStamp(self.source)
+        header = stamp.key()
+        self.assertEqual(stamp.check(header), (True, False))
+        st = self.source.stat()
+        os.utime(self.source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(SourceStamp(self.source).check(header), (True, True))
+        self.source.write_text(json.dumps(GEOREF[::-1]), encoding="utf-8")
+        self.assertEqual(SourceStamp(self.source).check(header), (False, False))
+
+    def test_touched_source_refreshes_the_header(self):
+        cache, _ = self.sidecars(self.registry())
+        self.registry().shape("Plain")
+        st = self.source.stat()
+        os.utime(self.source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(self.registry().shape("Plain"), GEOREF[0]["geo_shape"])
+        self.assertIn(f'"mtime_ns": {st.st_mtime_ns + 10**9}'.encode(), cache.read_bytes())
+
+    def test_stale_sidecars_are_rebuilt(self):
+        self.registry().shape("Plain")
+        changed = [dict(GEOREF[0], geo_shape={"geometry": None}), *GEOREF[1:]]
+        self.source.write_text(json.dumps(changed), encoding="utf-8")
+        self.assertEqual(self.registry().shape("Plain"), {"geometry": None})
+        self.assertEqual(self.registry().shape("Plain"), {"geometry": None})
+
+    def test_damaged_sidecars_are_rebuilt(self):
+        cache, index = self.sidecars(self.registry())
+        self.registry().shapes(["Plain", "02"])
+        blob = cache.read_bytes()
+        for damaged in (blob[: len(blob) // 2], blob[:6], b"garbage", GeometryCache.MAGIC + b"\xff" * 40):
+            with self.subTest(damaged=damaged[:8]):
+                cache.write_bytes(damaged)
+                index.write_bytes(damaged)
+                self.assertEqual(self.registry().shape("02"), GEOREF[1]["geo_shape"])
+                stamp = SourceStamp(self.source)
+                self.assertEqual(GeometryCache(stamp, self.cache_dir).get("02"), GEOREF[1]["geo_shape"])
+                self.assertIsNotNone(OffsetIndex(stamp, self.cache_dir)._read())
+
+    def test_without_cache_dir(self):
+        registry = ProvinceRegistry(self.source, None)
+        self.assertIsNone(registry.cache)
+        self.assertEqual(registry.shapes(["Plain", "03"])["03"], GEOREF[2]["geo_shape"])
+        with self.assertRaises(KeyError):
+            registry.shape("Missing")
+        with mock.patch.object(geodata, "CACHE_DIR", None):
+            self.assertEqual(geodata.load_provinces("02", self.source), GEOREF[1]["geo_shape"])
+        self.assertFalse(self.cache_dir.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Tests for the build-time label placement of :mod:`labels`."""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from clustering import TILE_SIZE, project  # noqa: E402
+from labels import CHAR_WIDTH, LABEL_HEIGHT, LABEL_OFFSET, place_labels  # noqa: E402
+
+
+def boxes(lat, lon, names, zoom):
+    """Pixel boxes of the labels at ``zoom``, as :func:`labels.place_labels` sees them."""
+    x, y = project(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+    scale = TILE_SIZE * 2**zoom
+    half = np.array([len(name) for name in names]) * CHAR_WIDTH / 2
+    px, py = x * scale, y * scale
+    return np.stack([px - half, py + LABEL_OFFSET, px + half, py + LABEL_OFFSET + LABEL_HEIGHT], axis=1)
+
+
+class PlaceLabelsTest(unittest.TestCase):
+    def test_shown_labels_never_overlap(self):
+        rng = np.random.default_rng(7)
+        n = 300
+        lat = 43 + rng.random(n) * 0.5
+        lon = -2.5 + rng.random(n) * 0.8
+        names = [f"Peak {'x' * int(k)}" for k in rng.integers(0, 12, n)]
+        order = list(rng.permutation(n))
+        min_zoom = place_labels(lat, lon, names, order, max_zoom=16)
+        for z in range(17):
+            shown = [i for i in range(n) if min_zoom[i] <= z]
+            b = boxes(lat[shown], lon[shown], [names[i] for i in shown], z)
+            overlap = (
+                (b[:, None, 0] < b[None, :, 2])
+                & (b[None, :, 0] < b[:, None, 2])
+                & (b[:, None, 1] < b[None, :, 3])
+                & (b[None, :, 1] < b[:, None, 3])
+            )
+            np.fill_diagonal(overlap, False)
+            with self.subTest(zoom=z):
+                self.assertFalse(overlap.any())
+        # Dense enough to hide labels at low zoom, sparse enough to show them all up close.
+        self.assertLess(sum(z <= 8 for z in min_zoom), n)
+        self.assertLessEqual(max(min_zoom), 16)
+
+    def test_priority_and_collisions(self):
+        # Two peaks at the same spot collide at every zoom: the first in order wins.
+        lat, lon, names = [43.0, 43.0, -33.9], [-2.0, -2.0, 151.2], ["Low", "High", "Far"]
+        self.assertEqual(place_labels(lat, lon, names, [1, 0, 2], max_zoom=18), [19, 0, 0])
+        self.assertEqual(place_labels(lat, lon, names, [0, 1, 2], max_zoom=18), [0, 19, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for the TopoJSON encoding of :mod:`topology`."""
+import math
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import build_map  # noqa: E402
+from geodata import load_provinces  # noqa: E402
+from topology import build_topology  # noqa: E402
+
+
+def arc_ids(arcs):
+    """Indices of the arcs referenced by a geometry, in order."""
+    if isinstance(arcs, int):
+        return [arcs if arcs >= 0 else ~arcs]
+    return [i for a in arcs for i in arc_ids(a)]
+
+
+def square(x, y, size=1.0):
+    ring = [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def absolute(arc):
+    """Undo the delta encoding of an arc."""
+    x = y = 0
+    points = []
+    for dx, dy in arc:
+        x, y = x + dx, y + dy
+        points.append((x, y))
+    return points
+
+
+def ring(arcs, ids):
+    """Join the arcs of a ring, as the page's decoder does."""
+    out = []
+    for i in ids:
+        arc = arcs[~i][::-1] if i < 0 else arcs[i]
+        out.extend(arc[1:] if out else arc)
+    return out
+
+
+def vertices_per_level(topology, levels, region):
+    """Vertices drawn for ``region`` at each level, coarsest first."""
+    geometry = next(g for g in topology["objects"]["regions"]["geometries"] if g["id"] == region)
+    used, current, counts = arc_ids(geometry["arcs"]), {}, []
+    for _, ids, arcs in reversed(levels):
+        current.update(zip(ids, map(len, arcs)))
+        counts.append(sum(current[i] for i in used))
+    return counts[::-1]
+
+
+class SharedArcsTest(unittest.TestCase):
+    def setUp(self):
+        # Two squares sharing the x = 1 edge, and a duplicate of the first one.
+        shapes = {"a": square(0, 0), "b": square(1, 0), "c": square(0, 0)}
+        self.topology, self.levels = build_topology(shapes, quantum=0.5)
+        self.arcs = [absolute(a) for a in self.topology["arcs"]]
+        self.geometries = {g["id"]: g for g in self.topology["objects"]["regions"]["geometries"]}
+
+    def test_shared_border_is_stored_once(self):
+        self.assertEqual(len(self.arcs), 3)
+        refs = {rid: g["arcs"][0] for rid, g in self.geometries.items()}
+        self.assertEqual(refs["a"], refs["c"])
+        shared = set(arc_ids(refs["a"])) & set(arc_ids(refs["b"]))
+        self.assertEqual(len(shared), 1)
+        # The border is walked in opposite directions by the two squares.
+        (i,) = shared
+        self.assertEqual({i, ~i}, {r for r in refs["a"] + refs["b"] if r in (i, ~i)})
+        self.assertEqual(sorted(self.arcs[i]), [(2, 0), (2, 2)])
+
+    def test_rings_are_closed(self):
+        scale = self.topology["transform"]["scale"][0]
+        translate = self.topology["transform"]["translate"]
+        for rid, x in (("a", 0), ("b", 1), ("c", 0)):
+            with self.subTest(region=rid):
+                points = ring(self.arcs, self.geometries[rid]["arcs"][0])
+                self.assertEqual(points[0], points[-1])
+                corners = {(px * scale + translate[0], py * scale + translate[1]) for px, py in points}
+                self.assertEqual(corners, {(x, 0), (x + 1, 0), (x + 1, 1), (x, 1)})
+
+    def test_finest_level_stores_every_arc(self):
+        self.assertEqual(len(self.levels), 1)
+        _, ids, arcs = self.levels[-1]
+        self.assertEqual(ids, list(range(len(self.arcs))))
+        self.assertEqual(arcs, self.topology["arcs"])
+
+
+class LevelsOfDetailTest(unittest.TestCase):
+    def test_coarse_levels_reference_finer_arcs(self):
+        # A round region next to a square one: only the round arcs simplify.
+        circle = [[2 + math.cos(t / 50 * math.pi), 0.5 + math.sin(t / 50 * math.pi)] for t in range(100)]
+        shapes = {"round": {"type": "Polygon", "coordinates": [circle + circle[:1]]}, "square": square(5, 0)}
+        topology, levels = build_topology(shapes, ((0, 0.1), (10, 0.0)), quantum=1e-3)
+        self.assertEqual(len(levels), 2)
+        (_, coarse, _), (_, fine, _) = levels
+        self.assertEqual(fine, list(range(len(topology["arcs"]))))
+        self.assertLess(len(coarse), len(fine))
+        current = {}
+        geometries = topology["objects"]["regions"]["geometries"]
+        for _, ids, arcs in reversed(levels):
+            current.update(zip(ids, map(absolute, arcs)))
+            for g in geometries:
+                points = ring(current, g["arcs"][0])
+                self.assertEqual(points[0], points[-1])
+        self.assertLess(len(ring(current, geometries[0]["arcs"][0])), 50)
+
+    def test_country_is_simplified_at_low_zoom(self):
+        shapes = {"Japan": load_provinces("Japan", build_map.JAPAN_FILE)}
+        quantum = 10.0**-build_map.POLYGON_PRECISION
+        topology, levels = build_topology(shapes, build_map.LOD_LEVELS, quantum, build_map.SIMPLIFY_METHOD)
+        counts = vertices_per_level(topology, levels, "Japan")
+        self.assertLess(counts[0], 0.75 * counts[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()